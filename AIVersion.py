@@ -2,6 +2,9 @@ import random
 import math
 import pandas as pd
 from collections import defaultdict
+from itertools import accumulate
+
+from DuplicateNames import DuplicateNameIndex
 
 class Person:
     """
@@ -66,7 +69,11 @@ class PersonFactory:
         df_fn = pd.read_csv('first_names.csv')
         self.first_names = {}
         for (decade, gender), group in df_fn.groupby(['decade', 'gender']):
-            self.first_names[(decade, gender)] = list(zip(group['name'], group['frequency']))
+            # names and cumulative weights, built once instead of for every person
+            self.first_names[(decade, gender)] = (
+                group['name'].tolist(),
+                list(accumulate(group['frequency'].tolist())),
+            )
 
         # 6. Birth and Marriage Rates
         df_bm = pd.read_csv('birth_and_marriage_rates.csv')
@@ -91,16 +98,11 @@ class PersonFactory:
     def get_person(self, year_born, is_direct_descendant=False, root_last_names=None):
         decade = self.get_decade_str(year_born)
 
-        # Combine both male and female names for the decade into one pool
-        names_info_male = self.first_names.get((decade, 'male'), [])
-        names_info_female = self.first_names.get((decade, 'female'), [])
-        all_names_info = names_info_male + names_info_female
-        
-        first_names = [x[0] for x in all_names_info]
-        # random.choices will automatically handle weights that don't sum to 1.0
-        probs = [x[1] for x in all_names_info] 
-        
-        first_name = random.choices(first_names, weights=probs, k=1)[0]
+        # Pick a gender from gender_name_probability.csv, then a name from that gender's pool
+        genders = self.gender_prob[decade]
+        gender = random.choices(list(genders), weights=list(genders.values()), k=1)[0]
+        first_names, cum_weights = self.first_names[(decade, gender)]
+        first_name = random.choices(first_names, cum_weights=cum_weights, k=1)[0]
         # ------------------------------------------
 
         # Last Name Logic
@@ -130,6 +132,8 @@ class FamilyTree:
         self.roots = []
         self.factory = PersonFactory()
         self.max_year = 2120
+        # full name counts, kept up to date as people are generated
+        self.name_index = DuplicateNameIndex()
 
     def generate_tree(self):
         """
@@ -152,6 +156,9 @@ class FamilyTree:
         person2.set_partner(person1)
 
         self.roots = [person1, person2]
+        self.name_index = DuplicateNameIndex()
+        self.name_index.add(person1.get_full_name())
+        self.name_index.add(person2.get_full_name())
 
         # Use a queue for Breadth-First Search (BFS) generation
         queue = [person1]
@@ -178,6 +185,7 @@ class FamilyTree:
                 partner = self.factory.get_partner(current_person)
                 current_person.set_partner(partner)
                 partner.set_partner(current_person)
+                self.name_index.add(partner.get_full_name())
                 
                 # Immediately mark the newly generated partner as processed
                 processed_families.add(partner)
@@ -214,6 +222,8 @@ class FamilyTree:
                         root_last_names=self.root_last_names
                     )
                     
+                    self.name_index.add(child.get_full_name())
+
                     # Add child to the current person
                     current_person.add_child(child)
                     
@@ -252,10 +262,7 @@ class FamilyTree:
         return people
 
     def get_duplicates(self):
-        name_counts = defaultdict(int)
-        for p in self.get_all_people():
-            name_counts[p.get_full_name()] += 1
-        return [name for name, count in name_counts.items() if count > 1]
+        return self.name_index.duplicates()
 
     def interact(self):
         while True:
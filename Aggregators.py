@@ -0,0 +1,379 @@
+import hashlib
+import heapq
+import math
+from array import array
+
+
+# returns a 64 bit hash of a string that is the same in every process (unlike hash())
+def stable_hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+# returns "first last" for a person
+def full_name(person):
+    return f"{person.get_first_name()} {person.get_last_name()}"
+
+
+class Aggregator:
+    # a statistic fed by the generation loop: add is called for every new person and
+    # add_family for every couple once their children are generated (FamilyTree.extend gives
+    # cut off couples more children: it retracts their family with remove_family first)
+    # aggregators of the same kind and settings can be merged, e.g. from parallel runs
+    name = "aggregator"
+
+    # records a new person
+    def add(self, person):
+        pass
+
+    # records a couple's children (person is the descendant, children may be empty)
+    def add_family(self, person, children):
+        pass
+
+    # undoes add_family(person, children), aggregators that record families must implement it
+    def remove_family(self, person, children):
+        pass
+
+    # adds another aggregator of the same kind into this one
+    def merge(self, other):
+        raise NotImplementedError
+
+    # returns an empty aggregator with the same settings
+    def empty(self):
+        raise NotImplementedError
+
+    # returns the statistic as plain (json-ready) values
+    def result(self):
+        raise NotImplementedError
+
+
+class PeopleCount(Aggregator):
+    # exact number of people
+    name = "people"
+
+    def __init__(self):
+        self.count = 0
+
+    def add(self, person):
+        self.count += 1
+
+    def merge(self, other):
+        self.count += other.count
+
+    def empty(self):
+        return PeopleCount()
+
+    def result(self):
+        return self.count
+
+
+class DecadeCount(Aggregator):
+    # exact number of people born in each decade
+    name = "people_by_decade"
+
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, person):
+        decade = person.get_year_born() // 10 * 10
+        self.counts[decade] = self.counts.get(decade, 0) + 1
+
+    def merge(self, other):
+        for decade, count in other.counts.items():
+            self.counts[decade] = self.counts.get(decade, 0) + count
+
+    def empty(self):
+        return DecadeCount()
+
+    def result(self):
+        return {f"{decade}s": count for decade, count in sorted(self.counts.items())}
+
+
+class NameCount(Aggregator):
+    # exact count of every full name, memory grows with the number of distinct names
+    name = "names"
+
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, person):
+        name = full_name(person)
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def merge(self, other):
+        for name, count in other.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+
+    def empty(self):
+        return NameCount()
+
+    # returns the names given to more than one person
+    def duplicates(self):
+        return [name for name, count in self.counts.items() if count > 1]
+
+    def result(self):
+        return {"distinct": len(self.counts), "duplicates": len(self.duplicates())}
+
+
+class DistinctNames(Aggregator):
+    # HyperLogLog estimate of the number of distinct full names, 2 ** precision bytes,
+    # standard error about 1.04 / sqrt(2 ** precision)
+    name = "distinct_names"
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, person):
+        value = stable_hash(full_name(person))
+        bucket = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        # position of the first 1 bit in the remaining bits
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[bucket]:
+            self.registers[bucket] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("cannot merge HyperLogLogs with different precisions")
+        registers = self.registers
+        for i, rank in enumerate(other.registers):
+            if rank > registers[i]:
+                registers[i] = rank
+
+    def empty(self):
+        return DistinctNames(self.precision)
+
+    # returns the estimated number of distinct names
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        # small range correction (linear counting)
+        if raw <= 2.5 * m and zeros > 0:
+            return m * math.log(m / zeros)
+        return raw
+
+    def result(self):
+        return round(self.estimate())
+
+
+class NameFrequencies(Aggregator):
+    # Count-Min sketch of full name counts, estimates never undercount and overcount by at
+    # most about 2.7 / width of all people with probability 1 - e ** -depth
+    name = "name_frequencies"
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = array("Q", bytes(8 * width * depth))
+
+    # returns the table cell of name in every row
+    def cells(self, name):
+        value = stable_hash(name)
+        first = value & 0xFFFFFFFF
+        second = (value >> 32) | 1
+        return [row * self.width + (first + row * second) % self.width for row in range(self.depth)]
+
+    def add(self, person):
+        table = self.table
+        for cell in self.cells(full_name(person)):
+            table[cell] += 1
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("cannot merge Count-Min sketches with different sizes")
+        table = self.table
+        for i, count in enumerate(other.table):
+            table[i] += count
+
+    def empty(self):
+        return NameFrequencies(self.width, self.depth)
+
+    # returns the estimated number of people named name
+    def estimate(self, name):
+        return min(self.table[cell] for cell in self.cells(name))
+
+    def result(self):
+        return {"width": self.width, "depth": self.depth, "people": sum(self.table[: self.width])}
+
+
+class TopNames(Aggregator):
+    # space-saving summary of the k most common full names, any name with more than
+    # people / k occurrences is kept and each count overestimates by at most its error
+    name = "top_names"
+
+    def __init__(self, k=100):
+        self.k = k
+        # name -> [count, error]
+        self.counters = {}
+        # min-heap with one (count, name) per counter, a count may have grown since it was pushed
+        self.heap = []
+
+    def add(self, person):
+        self.offer(full_name(person), 1)
+
+    # adds count occurrences of name
+    def offer(self, name, count, error=0):
+        counters = self.counters
+        counter = counters.get(name)
+        if not counter is None:
+            counter[0] += count
+            counter[1] += error
+            return
+        if len(counters) < self.k:
+            counters[name] = [count, error]
+            heapq.heappush(self.heap, (count, name))
+            return
+        # replace the smallest counter, the new name inherits its count as error
+        smallest, smallest_name = self.pop_smallest()
+        del counters[smallest_name]
+        counters[name] = [smallest + count, smallest + error]
+        heapq.heappush(self.heap, (smallest + count, name))
+
+    # removes and returns the (count, name) of the smallest counter
+    def pop_smallest(self):
+        while True:
+            count, name = heapq.heappop(self.heap)
+            current = self.counters[name][0]
+            if current == count:
+                return count, name
+            # out of date, put it back with its real count
+            heapq.heappush(self.heap, (current, name))
+
+    def merge(self, other):
+        # a name missing from one summary may have had up to its smallest count there
+        own_min = min((c[0] for c in self.counters.values()), default=0)
+        other_min = min((c[0] for c in other.counters.values()), default=0)
+        if len(self.counters) < self.k:
+            own_min = 0
+        if len(other.counters) < other.k:
+            other_min = 0
+        merged = {}
+        for name in set(self.counters) | set(other.counters):
+            count, error = self.counters.get(name, [own_min, own_min])
+            other_count, other_error = other.counters.get(name, [other_min, other_min])
+            merged[name] = [count + other_count, error + other_error]
+        top = heapq.nlargest(self.k, merged.items(), key=lambda item: item[1][0])
+        self.counters = {name: counter for name, counter in top}
+        self.heap = [(counter[0], name) for name, counter in top]
+        heapq.heapify(self.heap)
+
+    def empty(self):
+        return TopNames(self.k)
+
+    # returns [(name, count, error), ...] for the n most common names, most common first
+    def top(self, n=None):
+        ranked = sorted(self.counters.items(), key=lambda item: (-item[1][0], item[0]))
+        return [(name, count, error) for name, (count, error) in ranked[:n]]
+
+    # returns the names that are certainly given to more than one person
+    def duplicates(self):
+        return [name for name, count, error in self.top() if count - error > 1]
+
+    def result(self):
+        return [[name, count, error] for name, count, error in self.top()]
+
+
+class Histogram(Aggregator):
+    # streaming histogram with fixed width bins, memory grows with the range of values only
+    name = "histogram"
+
+    def __init__(self, bin_width=1):
+        self.bin_width = bin_width
+        self.bins = {}
+        self.count = 0
+        self.total = 0
+
+    # records one value
+    def add_value(self, value):
+        key = value // self.bin_width
+        self.bins[key] = self.bins.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+
+    # removes one value recorded by add_value
+    def remove_value(self, value):
+        key = value // self.bin_width
+        self.bins[key] -= 1
+        if self.bins[key] == 0:
+            del self.bins[key]
+        self.count -= 1
+        self.total -= value
+
+    def merge(self, other):
+        if other.bin_width != self.bin_width:
+            raise ValueError("cannot merge histograms with different bin widths")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.count += other.count
+        self.total += other.total
+
+    def empty(self):
+        return type(self)(self.bin_width)
+
+    # returns the lower edge of the bin holding the q quantile
+    def quantile(self, q):
+        target = q * self.count
+        seen = 0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen >= target:
+                return key * self.bin_width
+        return None
+
+    def result(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count > 0 else 0.0,
+            "median": self.quantile(0.5),
+            "bins": {key * self.bin_width: count for key, count in sorted(self.bins.items())},
+        }
+
+
+class LifespanHistogram(Histogram):
+    # years between birth and death
+    name = "lifespans"
+
+    def add(self, person):
+        self.add_value(person.get_year_died() - person.get_year_born())
+
+
+class FamilySizeHistogram(Histogram):
+    # number of children per couple (or single parent)
+    name = "family_sizes"
+
+    def add_family(self, person, children):
+        self.add_value(len(children))
+
+    def remove_family(self, person, children):
+        self.remove_value(len(children))
+
+
+# returns the usual set of aggregators: the exact counts plus the memory-bounded sketches
+def default_aggregators():
+    return [
+        PeopleCount(),
+        DecadeCount(),
+        DistinctNames(),
+        NameFrequencies(),
+        TopNames(),
+        LifespanHistogram(),
+        FamilySizeHistogram(),
+    ]
+
+
+# returns {name: result} for a list of aggregators
+def aggregate_results(aggregators):
+    return {aggregator.name: aggregator.result() for aggregator in aggregators}
+
+
+# merges lists of aggregators (the same kinds in the same order) into fresh ones
+def merge_aggregators(aggregator_lists):
+    merged = None
+    for aggregators in aggregator_lists:
+        if merged is None:
+            merged = [aggregator.empty() for aggregator in aggregators]
+        for mine, theirs in zip(merged, aggregators):
+            mine.merge(theirs)
+    return [] if merged is None else merged
@@ -0,0 +1,171 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import platform
+import resource
+import subprocess
+import time
+import timeit
+from concurrent.futures import ProcessPoolExecutor
+
+from FamilyTree import FamilyTree
+from PersonFactory import PersonFactory
+from RandomSource import make_rng
+
+# FamilyTree options (and the factory's rate multipliers) swept by the generation benchmark
+default_grid = {
+    "batched": [False, True],
+    "columnar": [False, True],
+    "backend": ["python", "numpy"],
+    "end_year": [2120, 2150],
+    "birth_scale": [1.0, 1.5],
+}
+# grid options that go to PersonFactory.set_rate_scales instead of FamilyTree
+rate_scale_options = ("birth_scale", "marriage_scale")
+
+
+# returns nanoseconds per call of fn, best of repeat runs
+def time_call(fn, number=2000, repeat=5):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e9
+
+
+# returns the cost of each attribute sampler in ns per call
+def benchmark_sampling(seed=0, number=2000):
+    with contextlib.redirect_stdout(io.StringIO()):
+        factory = PersonFactory(make_rng(seed))
+        tree = FamilyTree(factory=factory, stream=True)
+    parent = tree.first_people[0]
+    years = list(range(1950, 2121))
+    batch_years = [years[i % len(years)] for i in range(number)]
+    batch_flags = [i % 2 == 0 for i in range(number)]
+    return {
+        "get_year_died": time_call(lambda: factory.get_year_died(1990), number),
+        "get_first_name": time_call(lambda: factory.get_first_name(1990), number),
+        "get_last_name_direct": time_call(lambda: factory.get_last_name(True, 1990), number),
+        "get_last_name_partner": time_call(lambda: factory.get_last_name(False, 1990), number),
+        "generate_person": time_call(lambda: factory.generate_person(1990, False), number),
+        "generate_partner": time_call(lambda: factory.generate_partner(1990), number),
+        "get_children": time_call(
+            lambda: factory.get_children(1990, parent, None, True), number
+        ),
+        "generate_people_per_person": time_call(
+            lambda: factory.generate_people(batch_years, batch_flags), 1, 20
+        ) / number,
+    }
+
+
+# builds trees for every seed with one option set, meant to run in a fresh process
+def run_generation(options, seeds):
+    backend = options.get("backend", "python")
+    scales = {key: value for key, value in options.items() if key in rate_scale_options}
+    tree_options = {
+        key: value for key, value in options.items()
+        if key != "backend" and not key in rate_scale_options
+    }
+    with contextlib.redirect_stdout(io.StringIO()):
+        factory = PersonFactory()
+    factory.set_rate_scales(**scales)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    total_people = 0
+    start = time.perf_counter()
+    for seed in seeds:
+        tree = FamilyTree(factory=factory, rng=make_rng(seed, backend), **tree_options)
+        total_people += tree.get_total_number_of_people()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "options": options,
+        "trees": len(seeds),
+        "people": total_people,
+        "seconds": elapsed,
+        "people_per_second": total_people / elapsed if elapsed > 0 else 0.0,
+        "rss_before_kb": rss_before,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+# returns one generation result per combination of the grid, each measured in its own process
+def benchmark_generation(grid=None, seeds=range(20)):
+    if grid is None:
+        grid = default_grid
+    seeds = list(seeds)
+    results = []
+    keys = list(grid)
+    for values in itertools.product(*(grid[key] for key in keys)):
+        options = dict(zip(keys, values))
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results.append(executor.submit(run_generation, options, seeds).result())
+    return results
+
+
+# returns the latency of the tree queries in ns per call
+def benchmark_queries(seed=0, number=200):
+    with contextlib.redirect_stdout(io.StringIO()):
+        tree = FamilyTree(indexed=True, rng=make_rng(seed))
+    index = tree.index
+    person = index.people[len(index.people) // 2]
+    root = tree.first_people[0]
+    first_name = person.get_first_name()
+    last_name = person.get_last_name()
+
+    def print_by_decade():
+        with contextlib.redirect_stdout(io.StringIO()):
+            tree.print_total_number_of_people_by_decade()
+
+    return {
+        "people": tree.get_total_number_of_people(),
+        "total": time_call(tree.get_total_number_of_people, number),
+        "by_decade": time_call(print_by_decade, number),
+        "duplicate_names": time_call(tree.get_duplicate_names, number),
+        "find_by_name": time_call(lambda: index.find_by_name(first_name, last_name), number),
+        "count_alive_in": time_call(lambda: index.count_alive_in(2050), number),
+        "is_ancestor": time_call(lambda: index.is_ancestor(root, person), number),
+        "count_descendants": time_call(lambda: index.count_descendants(root), number),
+    }
+
+
+# returns the current git commit, or None outside a git checkout
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# runs every benchmark and returns the results as a json-ready dict
+def run_benchmarks(seeds=range(20), grid=None):
+    seeds = list(seeds)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "seeds": seeds,
+        },
+        "sampling_ns": benchmark_sampling(seeds[0]),
+        "generation": benchmark_generation(grid, seeds),
+        "queries_ns": benchmark_queries(seeds[0]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark family tree generation and queries")
+    parser.add_argument("--seeds", type=int, default=20, help="number of trees per configuration")
+    parser.add_argument("--out", default=None, help="write json here instead of stdout")
+    args = parser.parse_args()
+    results = run_benchmarks(range(args.seeds))
+    if args.out is None:
+        print(json.dumps(results, indent=2))
+    else:
+        with open(args.out, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import csv
+import hashlib
+import os
+import pickle
+
+# the data files the tables are built from
+data_files = [
+    "first_names.csv",
+    "last_names.csv",
+    "life_expectancy.csv",
+    "birth_and_marriage_rates.csv",
+    "rank_to_probability.csv",
+    "gender_name_probability.csv",
+]
+
+# bump when the layout of the parsed tables changes, so old caches are rebuilt
+CACHE_VERSION = 1
+CACHE_FILE = ".data_tables.pickle"
+
+
+# returns the rows of a csv file as lists of strings, without the header if header is True
+def read_rows(path, header=True):
+    with open(path, newline="") as file:
+        rows = [row for row in csv.reader(file) if len(row) > 0]
+    return rows[1:] if header else rows
+
+
+# returns "1950s" as 1950
+def decade_year(decade):
+    return int(decade[:-1])
+
+
+# parses the data files in directory into plain python tables:
+#   life_expectancy: {year: life expectancy (truncated to an int)}
+#   rates: {decade: (birth rate, marriage rate)}
+#   first_names: {decade: [(gender, name, frequency), ...]} in file order
+#   last_names: {decade: [name, ...]} in file (rank) order
+#   rank_probability: [probability of rank 1, rank 2, ...]
+#   gender_probability: {decade: {gender: probability}}
+def parse_tables(directory="."):
+    def path(name):
+        return os.path.join(directory, name)
+
+    tables = {
+        "life_expectancy": {},
+        "rates": {},
+        "first_names": {},
+        "last_names": {},
+        "rank_probability": [],
+        "gender_probability": {},
+    }
+    for year, life_expectancy in read_rows(path("life_expectancy.csv")):
+        tables["life_expectancy"][int(year)] = int(float(life_expectancy))
+    for decade, birth_rate, marriage_rate in read_rows(path("birth_and_marriage_rates.csv")):
+        tables["rates"][decade_year(decade)] = (float(birth_rate), float(marriage_rate))
+    for decade, gender, name, frequency in read_rows(path("first_names.csv")):
+        tables["first_names"].setdefault(decade_year(decade), []).append(
+            (gender, name, float(frequency))
+        )
+    for decade, rank, name in read_rows(path("last_names.csv")):
+        tables["last_names"].setdefault(decade_year(decade), []).append(name)
+    for row in read_rows(path("rank_to_probability.csv"), header=False):
+        tables["rank_probability"].extend(float(x) for x in row)
+    for decade, gender, probability in read_rows(path("gender_name_probability.csv")):
+        tables["gender_probability"].setdefault(decade_year(decade), {})[gender] = float(probability)
+    return tables
+
+
+# returns the sha256 of a file
+def file_hash(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+# returns {file: (mtime_ns, size)} for the data files in directory
+def file_stamps(directory="."):
+    stamps = {}
+    for name in data_files:
+        stat = os.stat(os.path.join(directory, name))
+        stamps[name] = (stat.st_mtime_ns, stat.st_size)
+    return stamps
+
+
+# returns the tables from parse_tables, from a pickle cache next to the data files when it is
+# still valid (same mtimes and sizes, or else the same file hashes) and rebuilding it otherwise
+def load_tables(directory=".", cache_path=None):
+    if cache_path is None:
+        cache_path = os.path.join(directory, CACHE_FILE)
+    stamps = file_stamps(directory)
+
+    cache = None
+    try:
+        with open(cache_path, "rb") as file:
+            cache = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        cache = None
+    if not cache is None and cache.get("version") == CACHE_VERSION:
+        if cache["stamps"] == stamps:
+            return cache["tables"]
+        # touched but maybe not changed (e.g. a fresh checkout), compare the contents
+        hashes = {name: file_hash(os.path.join(directory, name)) for name in data_files}
+        if cache["hashes"] == hashes:
+            cache["stamps"] = stamps
+            write_cache(cache_path, cache)
+            return cache["tables"]
+    else:
+        hashes = {name: file_hash(os.path.join(directory, name)) for name in data_files}
+
+    tables = parse_tables(directory)
+    write_cache(
+        cache_path,
+        {"version": CACHE_VERSION, "stamps": stamps, "hashes": hashes, "tables": tables},
+    )
+    return tables
+
+
+# writes a cache atomically, a read-only directory just means no cache
+def write_cache(cache_path, cache):
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            pickle.dump(cache, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
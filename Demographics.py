@@ -0,0 +1,148 @@
+import numpy as np
+
+# how years outside the data files get their parameters:
+#   clamp: use the nearest year/decade the files cover
+#   trend: continue a linear trend fitted to the covered years nearest to them (rates and life
+#          expectancy only, names use the nearest decade)
+#   error: raise ValueError
+extrapolations = ("clamp", "trend", "error")
+
+
+class YearParameters:
+    # everything sampling needs for someone born in year, decade is the key of the name
+    # tables used (the nearest decade the files cover)
+    __slots__ = (
+        "year",
+        "decade",
+        "birth_rate",
+        "marriage_rate",
+        "life_expectancy",
+        "children_low",
+        "children_high",
+        "gender_table",
+        "first_name_tables",
+        "last_name_table",
+    )
+
+    def __init__(
+            self, year, decade, birth_rate, marriage_rate, life_expectancy, gender_table,
+            first_name_tables, last_name_table):
+        self.year = year
+        self.decade = decade
+        self.birth_rate = birth_rate
+        self.marriage_rate = marriage_rate
+        self.life_expectancy = life_expectancy
+        # couples have randrange(children_low, children_high) children
+        self.children_low = max(round(birth_rate - 1.5), 0)
+        self.children_high = max(round(birth_rate + 1.5), self.children_low + 1)
+        self.gender_table = gender_table
+        # {gender: first name table}
+        self.first_name_tables = first_name_tables
+        self.last_name_table = last_name_table
+
+
+class Demographics:
+    # the parameters of every birth year from first_year to last_year, resolved once so a
+    # lookup is one list index (or one array index for a batch of years)
+    # life_expectancy is {year: years}, rates {decade: (birth rate, marriage rate)} and
+    # name_tables {decade: (gender table, {gender: first name table}, last name table)}
+    # trend_span is how many covered years a trend is fitted to, and every birth/marriage rate
+    # is multiplied by birth_scale/marriage_scale
+
+    def __init__(
+            self, life_expectancy, rates, name_tables, first_year, last_year,
+            extrapolation="clamp", trend_span=30, birth_scale=1.0, marriage_scale=1.0):
+        if not extrapolation in extrapolations:
+            raise ValueError(
+                f"unknown extrapolation {extrapolation!r}, expected one of {list(extrapolations)}"
+            )
+        self.life_expectancy = life_expectancy
+        self.birth_rates = {decade: birth_rate for decade, (birth_rate, _) in rates.items()}
+        self.marriage_rates = {decade: marriage_rate for decade, (_, marriage_rate) in rates.items()}
+        self.name_tables = name_tables
+        self.extrapolation = extrapolation
+        self.trend_span = trend_span
+        self.birth_scale = birth_scale
+        self.marriage_scale = marriage_scale
+        self.first_year = first_year
+        self.years = []
+        self.cover(first_year, last_year)
+
+    # makes sure every year from first_year to last_year has its parameters
+    def cover(self, first_year, last_year):
+        # called for every tree and subtree, so an already covered range costs nothing
+        if len(self.years) > 0 and self.first_year <= first_year and last_year <= self.last_year:
+            return
+        first_year = min(first_year, self.first_year)
+        last_year = max(last_year, self.first_year + len(self.years) - 1)
+        known = {parameters.year: parameters for parameters in self.years}
+        self.years = [
+            known[year] if year in known else self.resolve(year)
+            for year in range(first_year, last_year + 1)
+        ]
+        self.first_year = first_year
+        self.last_year = last_year
+
+        # array versions for the batch api, indexed by year - first_year
+        self.decade_array = np.array([p.decade for p in self.years], dtype=np.int64)
+        self.life_expectancy_array = np.array([p.life_expectancy for p in self.years], dtype=np.int64)
+        self.marriage_rate_array = np.array([p.marriage_rate for p in self.years])
+        self.children_low_array = np.array([p.children_low for p in self.years], dtype=np.int64)
+        self.children_high_array = np.array([p.children_high for p in self.years], dtype=np.int64)
+
+    # returns the YearParameters of year
+    def get(self, year):
+        i = year - self.first_year
+        if 0 <= i < len(self.years):
+            return self.years[i]
+        self.cover(year, year)
+        return self.years[year - self.first_year]
+
+    # returns the indexes of an array of years into the arrays
+    def indexes(self, years):
+        if len(years) > 0 and (years.min() < self.first_year or years.max() > self.last_year):
+            self.cover(int(years.min()), int(years.max()))
+        return years - self.first_year
+
+    # returns the parameters of someone born in year
+    def resolve(self, year):
+        decade = year // 10 * 10
+        birth_rate = self.extrapolate(self.birth_rates, decade, "birth rate")
+        marriage_rate = self.extrapolate(self.marriage_rates, decade, "marriage rate")
+        life_expectancy = self.extrapolate(self.life_expectancy, year, "life expectancy")
+        name_decade = self.nearest(self.name_tables, decade, "names")
+        gender_table, first_name_tables, last_name_table = self.name_tables[name_decade]
+        return YearParameters(
+            year,
+            name_decade,
+            max(birth_rate * self.birth_scale, 0.0),
+            min(max(marriage_rate * self.marriage_scale, 0.0), 1.0),
+            # nobody dies before they are born
+            max(int(life_expectancy), 10),
+            gender_table,
+            first_name_tables,
+            last_name_table,
+        )
+
+    # returns the nearest key of table to key (or raises ValueError when extrapolation is error)
+    def nearest(self, table, key, label):
+        if key in table:
+            return key
+        if self.extrapolation == "error":
+            raise ValueError(f"no {label} data for {key} ({min(table)} to {max(table)} are covered)")
+        return min(max(key, min(table)), max(table))
+
+    # returns table[key], or the value extrapolated from the keys nearest to it
+    def extrapolate(self, table, key, label):
+        edge = self.nearest(table, key, label)
+        if edge == key or self.extrapolation == "clamp":
+            return table[edge]
+        # least squares line through the covered values closest to key, from the edge value
+        keys = sorted(table)
+        step = keys[1] - keys[0] if len(keys) > 1 else 1
+        span = max(self.trend_span // step, 2)
+        fitted = keys[-span:] if key > edge else keys[:span]
+        if len(fitted) < 2:
+            return table[edge]
+        slope = np.polyfit(fitted, [table[k] for k in fitted], 1)[0]
+        return table[edge] + float(slope) * (key - edge)
@@ -0,0 +1,81 @@
+from bisect import bisect_left, insort
+
+
+class DuplicateNameIndex:
+    # exact count of every full name, kept ready for the duplicate and most common name queries
+    # names are grouped into buckets by count and the counts in use are kept sorted, so adding
+    # a name is O(1) (plus a short insort when it reaches a count nobody had) and every query
+    # costs time proportional to its output, not to the number of distinct names
+
+    def __init__(self):
+        # full name -> count
+        self.counts = {}
+        # count -> {full name: None} of the names with that count, in the order they reached it
+        self.buckets = {}
+        # the counts that have a bucket, ascending
+        self.levels = []
+        # {full name: None} of the names with a count above 1, in the order they got there
+        self.duplicate_names = {}
+
+    # returns an index over an existing {full name: count} dict (which it keeps using as its
+    # counts), built in one pass instead of a name at a time
+    @classmethod
+    def from_counts(cls, counts):
+        index = cls()
+        index.counts = counts
+        for name, count in counts.items():
+            bucket = index.buckets.get(count)
+            if bucket is None:
+                bucket = index.buckets[count] = {}
+            bucket[name] = None
+            if count > 1:
+                index.duplicate_names[name] = None
+        index.levels = sorted(index.buckets)
+        return index
+
+    # counts count more people named name
+    def add(self, name, count=1):
+        old = self.counts.get(name, 0)
+        new = old + count
+        self.counts[name] = new
+        if old > 0:
+            bucket = self.buckets[old]
+            del bucket[name]
+            if len(bucket) == 0:
+                del self.buckets[old]
+                del self.levels[bisect_left(self.levels, old)]
+        bucket = self.buckets.get(new)
+        if bucket is None:
+            bucket = self.buckets[new] = {}
+            insort(self.levels, new)
+        bucket[name] = None
+        if old <= 1 < new:
+            self.duplicate_names[name] = None
+
+    # adds the counts of another index to this one
+    def merge(self, other):
+        for name, count in other.counts.items():
+            self.add(name, count)
+
+    # returns how many people are named name
+    def count(self, name):
+        return self.counts.get(name, 0)
+
+    # returns the number of distinct names
+    def __len__(self):
+        return len(self.counts)
+
+    # returns the names given to more than one person
+    def duplicates(self):
+        return list(self.duplicate_names)
+
+    # returns [(name, count), ...] for the k most common names, most common first (names with
+    # the same count in the order they reached it)
+    def top(self, k=10):
+        top = []
+        for level in reversed(self.levels):
+            for name in self.buckets[level]:
+                if len(top) == k:
+                    return top
+                top.append((name, level))
+        return top
@@ -1,37 +1,166 @@
 import math
 from collections import deque
 
+from Aggregators import aggregate_results
+from DuplicateNames import DuplicateNameIndex
 from PersonFactory import PersonFactory
+from Population import tree_population
+from Relationships import RelationshipIndex
+from TreeIndex import TreeIndex
+from TreeExport import export_tree, open_writer
+from TreeSnapshot import SnapshotStore, save_snapshot
+from TreeStore import TreeStore
 
 
 class FamilyTree:
-    first_people = []
-    people_queue = deque()
-    total_people = 0
-    total_people_by_decade = {}
-    names_count = {}
-
-    def __init__(self):
-        self.factory = PersonFactory()
-
-        # generate the first two people
-        self.first_people.append(
-            self.factory.generate_person(1950, is_direct_descendent=False)
-        )
-        self.first_people.append(
-            self.factory.generate_person(1950, is_direct_descendent=False)
-        )
-        self.update_family_stats(self.first_people[0])
-        self.update_family_stats(self.first_people[1])
-        self.first_people[0].set_partner(self.first_people[1])
-        self.first_people[1].set_partner(self.first_people[0])
-        self.first_people[0].set_is_direct_descendant(True)
-        self.first_people[1].set_is_direct_descendant(True)
-        self.factory.set_first_people(self.first_people)
+    store = None
+    index = None
+    instrumentation = None
+    # "1950s" style labels by year // 10, so they are not formatted for every person
+    decade_names = {}
+
+    def __init__(
+            self,
+            batched=False,
+            columnar=False,
+            stream=False,
+            factory=None,
+            subtree_root=None,
+            first_people=None,
+            rng=None,
+            indexed=False,
+            instrumentation=None,
+            end_year=2120,
+            aggregators=None,
+            start_year=1950):
+        # per-tree state, so several trees can be built in one process
+        self.first_people = []
+        self.people_queue = deque()
+        self.total_people = 0
+        self.total_people_by_decade = {}
+        # full name counts of everyone and of the direct descendants only (see DuplicateNames),
+        # names_count is the {full name: count} dict of the first
+        self.name_index = DuplicateNameIndex()
+        self.direct_name_index = DuplicateNameIndex()
+        self.names_count = self.name_index.counts
+        # "first last" strings by (first name, last name), so each is only formatted once
+        self.full_names = {}
+        # (person, partner birth year or None, children plan or None, next child) for everyone
+        # whose partner or children were born after end_year, so extend can pick them up
+        self.cut_off = []
+        self.end_year = end_year
+        if start_year > end_year:
+            raise ValueError(f"start year {start_year} is after end year {end_year}")
+        # extra statistics fed while generating (see Aggregators)
+        self.aggregators = [] if aggregators is None else list(aggregators)
+
+        # a factory can be shared between trees so the data files are only read once
+        if factory is None:
+            factory = PersonFactory(rng)
+        elif not rng is None:
+            factory.set_rng(rng)
+        factory.set_end_year(end_year)
+        self.factory = factory
+        # keep people as rows of a columnar store instead of linked Person objects
+        if columnar:
+            self.store = TreeStore()
+        # build name/year/lineage indexes (see TreeIndex) while generating
+        if indexed:
+            self.index = TreeIndex()
+        # time the generation phases (see Instrumentation), finished once the tree is built,
+        # when generation fails, or when a stream ends (see finish_instrumentation)
+        if not instrumentation is None:
+            self.instrumentation = instrumentation
+            instrumentation.attach(self)
+
+        try:
+            if subtree_root is None:
+                # generate the first two people (their last names are drawn like a partner's,
+                # but they are direct descendants before the statistics see them)
+                for _ in range(2):
+                    founder = self.factory.generate_person(start_year, is_direct_descendent=False)
+                    founder.set_is_direct_descendant(True)
+                    self.first_people.append(self.add_person(founder))
+                self.first_people[0].set_partner(self.first_people[1])
+                self.first_people[1].set_partner(self.first_people[0])
+                subtree_root = self.first_people[0]
+            else:
+                # only grow the descendants of an existing person (who is not counted here)
+                self.first_people = first_people
+            self.factory.set_first_people(self.first_people)
+            if not self.index is None:
+                self.index.root = subtree_root
+
+            # start tree generation (left to stream_people/stream_generations when streaming)
+            self.people_queue.append(subtree_root)
+            if stream:
+                return
+            if batched:
+                self.generate_tree_batched()
+            else:
+                self.generate_tree()
+        except BaseException:
+            self.finish_instrumentation()
+            raise
+        self.finish_instrumentation()
+
+    # stops the instrumentation (if any) and removes its timers from the tree and its shared
+    # factory, safe to call more than once
+    # streams call it when they end or are closed, a caller that stops reading a stream early
+    # can call it (or close the generator) so later trees on the factory are not timed
+    def finish_instrumentation(self):
+        if not self.instrumentation is None:
+            self.instrumentation.finish(self)
+
+    # writes the tree to a binary snapshot file (see TreeSnapshot)
+    def save(self, path):
+        save_snapshot(self, path)
+
+    # writes the tree's people to a csv/jsonl/parquet/arrow file (see TreeExport)
+    def export(self, path, format="csv", chunk_size=65536):
+        with open_writer(path, format) as writer:
+            return export_tree(self, writer, chunk_size)
+
+    # returns a read-only tree whose people are views over a mmapped snapshot file
+    @classmethod
+    def load(cls, path):
+        tree = cls.__new__(cls)
+        tree.factory = None
+        tree.store = SnapshotStore(path)
+        tree.first_people = [tree.store.view(0), tree.store.view(1)]
+        tree.people_queue = deque()
+        tree.cut_off = []
+        tree.end_year = None
+        tree.aggregators = []
+
+        stats = tree.store.stats()
+        tree.total_people = stats["total_people"]
+        tree.total_people_by_decade = stats["total_people_by_decade"]
+        tree.full_names = {}
+        tree.names_count = tree.snapshot_name_counts()
+        # the duplicate name indexes are only built if the tree is queried for them
+        tree.name_index = None
+        tree.direct_name_index = None
+        return tree
+
+    # records a newly generated person and returns the object the tree keeps for them
+    def add_person(self, person):
+        self.update_family_stats(person)
+        if not self.store is None:
+            person = self.store.add_person(person)
+        if not self.index is None:
+            self.index.add(person)
+        return person
 
-        # start tree generation
-        self.people_queue.append(self.first_people[0])
-        self.generate_tree()
+    # adds the statistics of another tree (e.g. a subtree built elsewhere) to this one
+    def merge_stats(self, other):
+        self.total_people += other.total_people
+        for decade, count in other.total_people_by_decade.items():
+            self.total_people_by_decade[decade] = self.total_people_by_decade.get(decade, 0) + count
+        self.name_index.merge(other.get_name_index())
+        self.direct_name_index.merge(other.get_name_index(direct_only=True))
+        for aggregator, other_aggregator in zip(self.aggregators, other.aggregators):
+            aggregator.merge(other_aggregator)
 
     # updates all relevant statistics for query
     def update_family_stats(self, person):
@@ -39,69 +168,316 @@ class FamilyTree:
             return
         self.total_people += 1
         year_born = person.get_year_born()
-        decade = f"{math.floor(year_born / 10 ) * 10}s"
+        decade = self.decade_names.get(year_born // 10)
+        if decade is None:
+            decade = f"{math.floor(year_born / 10 ) * 10}s"
+            self.decade_names[year_born // 10] = decade
         if decade in self.total_people_by_decade:
             self.total_people_by_decade[decade] += 1
         else:
             self.total_people_by_decade[decade] = 1
-        full_name = f"{person.get_first_name()} {person.get_last_name()}"
-        if full_name in self.names_count:
-            self.names_count[full_name] += 1
-        else:
-            self.names_count[full_name] = 1
+        key = (person.get_first_name(), person.get_last_name())
+        full_name = self.full_names.get(key)
+        if full_name is None:
+            full_name = f"{key[0]} {key[1]}"
+            self.full_names[key] = full_name
+        self.name_index.add(full_name)
+        if person.is_direct_descendant():
+            self.direct_name_index.add(full_name)
+        for aggregator in self.aggregators:
+            aggregator.add(person)
+
+    # passes a couple's newly generated children to the aggregators
+    def update_family_aggregators(self, person, children):
+        for aggregator in self.aggregators:
+            aggregator.add_family(person, children)
+
+    # tells the aggregators that a couple recorded with old_children now has children
+    def replace_family_aggregators(self, person, old_children, children):
+        for aggregator in self.aggregators:
+            aggregator.remove_family(person, old_children)
+            aggregator.add_family(person, children)
+
+    # returns {name: result} of the tree's aggregators
+    def get_aggregates(self):
+        return aggregate_results(self.aggregators)
 
     # generates the tree
     def generate_tree(self):
-        # while queue is not empty
-        while not len(self.people_queue) == 0:
-            # get person out of the queue
-            person = self.people_queue.popleft()
-
-            # generate their spouse
-            if person.get_partner() is None:
-                partner = self.factory.generate_partner(person.get_year_born())
-                self.update_family_stats(partner)
+        for _ in self.stream_people(keep_tree=True):
+            pass
+
+    # generates the tree one generation (the whole queue) at a time using the batch api
+    def generate_tree_batched(self):
+        for _ in self.stream_generations(keep_tree=True):
+            pass
+
+    # grows an already generated tree up to a later end year: only the people whose partner or
+    # children were cut off by the old end year are expanded, then generation carries on as usual
+    def extend(self, end_year, batched=False):
+        if self.factory is None:
+            raise ValueError("a loaded snapshot cannot be extended")
+        if not self.store is None:
+            # children are a consecutive row range, so new rows cannot join existing children
+            raise ValueError("extend needs a linked (non-columnar) tree")
+        if end_year <= self.end_year:
+            return
+        self.end_year = end_year
+        self.factory.set_end_year(end_year)
+        self.factory.set_first_people(self.first_people)
+
+        cut_off = self.cut_off
+        self.cut_off = []
+        for person, partner_year_born, plan, next_child in cut_off:
+            # a cut off partner is younger than anyone already born, so the plan still holds
+            if not partner_year_born is None:
+                partner = self.add_person(
+                    self.factory.generate_person(partner_year_born, is_direct_descendent=False)
+                )
+                if partner is None:
+                    self.cut_off.append((person, partner_year_born, plan, next_child))
+                    continue
                 person.set_partner(partner)
+                partner.set_partner(person)
+                partner.set_children(person.get_children())
+            if plan is None:
+                continue
 
-            # generate their children
+            children = [
+                self.add_person(child)
+                for child in self.factory.make_children(
+                    plan, person.is_direct_descendant(), next_child
+                )
+            ]
+            # family aggregators already saw this couple with the children born by the old end year
+            old_children = person.get_children() or ()
+            all_children = old_children + tuple(children)
+            if len(self.aggregators) > 0 and len(children) > 0:
+                self.replace_family_aggregators(person, old_children, all_children)
+            person.set_children(all_children)
             if not person.get_partner() is None:
-                children = self.factory.get_children(
+                person.get_partner().set_children(all_children)
+            for child in children:
+                child.set_parent(person)
+                self.people_queue.append(child)
+            next_child += len(children)
+            if next_child < plan[2]:
+                self.cut_off.append((person, None, plan, next_child))
+
+        if batched:
+            self.generate_tree_batched()
+        else:
+            self.generate_tree()
+
+    # yields every person once their partner and children have been generated, in BFS order
+    # (a new partner right after their spouse), so parents always come before their children
+    # with keep_tree=False parents do not hold their children and the parent links of people
+    # more than linked_generations generations behind the queue are cleared (see
+    # unlink_parents), so memory follows the queue instead of the whole tree (and nothing is
+    # remembered for extend)
+    # the instrumentation (if any) is finished when the stream ends or the generator is closed
+    def stream_people(self, keep_tree=False, linked_generations=1):
+        linked = deque()
+        generation = []
+        remaining = len(self.people_queue)
+        try:
+            # while queue is not empty
+            while not len(self.people_queue) == 0:
+                # the queue holds exactly the next generation once the last one is popped
+                if remaining == 0:
+                    if not keep_tree:
+                        self.unlink_parents(linked, generation, linked_generations)
+                        generation = []
+                    remaining = len(self.people_queue)
+                remaining -= 1
+                # get person out of the queue
+                person = self.people_queue.popleft()
+                if not keep_tree:
+                    generation.append(person)
+                if not self.instrumentation is None:
+                    self.instrumentation.record_pop(person, self.people_queue)
+
+                # generate their spouse
+                yield_partner = person is self.first_people[0]
+                cut_partner_year = None
+                if person.get_partner() is None:
+                    partner_year_born = self.factory.draw_partner_year(person.get_year_born())
+                    partner = None
+                    if not partner_year_born is None:
+                        partner = self.add_person(
+                            self.factory.generate_person(
+                                partner_year_born, is_direct_descendent=False
+                            )
+                        )
+                        if partner is None:
+                            cut_partner_year = partner_year_born
+                    person.set_partner(partner)
+                    if not partner is None:
+                        partner.set_partner(person)
+                        yield_partner = True
+
+                # generate their children
+                plan = self.factory.plan_children(
                     year_born=person.get_year_born(),
                     parent1=person,
                     parent2=person.get_partner(),
-                    direct_descendant=person.is_direct_descendant(),
-                )
-                person.set_children(children)
-                person.get_partner().set_children(children)
-            else:
-                children = self.factory.get_children(
-                    year_born=person.get_year_born(),
-                    parent1=person,
-                    parent2=None,
-                    direct_descendant=person.is_direct_descendant(),
                 )
-                person.set_children(children)
+                children = [
+                    self.add_person(child)
+                    for child in self.factory.make_children(plan, person.is_direct_descendant())
+                ]
+                if len(self.aggregators) > 0:
+                    self.update_family_aggregators(person, children)
+                if keep_tree:
+                    person.set_children(children)
+                    if not person.get_partner() is None:
+                        person.get_partner().set_children(person.get_children())
+                    if not cut_partner_year is None or len(children) < plan[2]:
+                        self.cut_off.append((person, cut_partner_year, plan, len(children)))
 
-            # if there is children, add them to the queue
-            if not len(children) == 0:
+                # if there is children, add them to the queue
                 for child in children:
-                    self.update_family_stats(child)
                     child.set_parent(person)
                     self.people_queue.append(child)
 
+                yield person
+                if yield_partner and not person.get_partner() is None:
+                    yield person.get_partner()
+        finally:
+            self.finish_instrumentation()
+
+    # yields one list per generation (the whole queue) with its people and their partners,
+    # once their partners and children have been generated using the batch api
+    # with keep_tree=False parents do not hold their children and the parent links of people
+    # more than linked_generations generations behind the queue are cleared (see
+    # unlink_parents), so memory follows the queue instead of the whole tree (and nothing is
+    # remembered for extend)
+    # the instrumentation (if any) is finished when the stream ends or the generator is closed
+    def stream_generations(self, keep_tree=False, linked_generations=1):
+        linked = deque()
+        try:
+            while not len(self.people_queue) == 0:
+                generation = list(self.people_queue)
+                self.people_queue.clear()
+                if not self.instrumentation is None:
+                    self.instrumentation.record_generation(generation)
+                finished = list(generation)
+                if generation[0] is self.first_people[0]:
+                    finished.append(self.first_people[1])
+
+                # generate spouses for everyone who does not have one yet
+                single = [person for person in generation if person.get_partner() is None]
+                partner_years, married = self.factory.draw_partner_years(
+                    [person.get_year_born() for person in single]
+                )
+                partners = self.factory.make_partners(partner_years, married)
+                cut_partner_years = {}
+                for person, partner_year_born, has_partner, partner in zip(
+                        single, partner_years.tolist(), married.tolist(), partners):
+                    partner = self.add_person(partner)
+                    person.set_partner(partner)
+                    if not partner is None:
+                        partner.set_partner(person)
+                        finished.append(partner)
+                    elif has_partner:
+                        cut_partner_years[person] = partner_year_born
+
+                # generate children for the whole generation
+                eldest_years_born = []
+                for person in generation:
+                    eldest_year_born = person.get_year_born()
+                    partner = person.get_partner()
+                    if not partner is None and partner.get_year_born() < eldest_year_born:
+                        eldest_year_born = partner.get_year_born()
+                    eldest_years_born.append(eldest_year_born)
+                plans = self.factory.plan_children_batch(
+                    [person.get_year_born() for person in generation], eldest_years_born
+                )
+                all_children = self.factory.make_children_batch(
+                    plans, [person.is_direct_descendant() for person in generation]
+                )
+
+                for i, (person, children) in enumerate(zip(generation, all_children)):
+                    children = [self.add_person(child) for child in children]
+                    if len(self.aggregators) > 0:
+                        self.update_family_aggregators(person, children)
+                    if keep_tree:
+                        person.set_children(children)
+                        if not person.get_partner() is None:
+                            person.get_partner().set_children(person.get_children())
+                        cut_partner_year = cut_partner_years.get(person)
+                        plan = (int(plans[0][i]), int(plans[1][i]), int(plans[2][i]))
+                        if not cut_partner_year is None or len(children) < plan[2]:
+                            self.cut_off.append((person, cut_partner_year, plan, len(children)))
+                    for child in children:
+                        child.set_parent(person)
+                        self.people_queue.append(child)
+
+                yield finished
+                if not keep_tree:
+                    self.unlink_parents(linked, generation, linked_generations)
+        finally:
+            self.finish_instrumentation()
+
+    # called by the streams (keep_tree=False) when a generation is done: every child links to
+    # its parent, so without this each person in the queue would keep all their ancestors (and
+    # their partners) alive
+    # linked holds the generations whose parent links are still kept, the oldest are unlinked
+    # once there are more than linked_generations of them; consumers reading a generation's
+    # parents after the stream has moved on (e.g. run_pipeline's threads) need a larger value
+    def unlink_parents(self, linked, generation, linked_generations):
+        linked.append(generation)
+        while len(linked) > linked_generations:
+            for person in linked.popleft():
+                person.set_parent(None)
+
     def get_total_number_of_people(self):
         return self.total_people
 
     def print_total_number_of_people_by_decade(self):
-        for decade, count in self.total_people_by_decade.items():
+        for decade, count in sorted(self.total_people_by_decade.items()):
             print(f"{decade}: {count}")
 
-    def get_duplicate_names(self):
-        duplicate_names = []
-        for name, count in self.names_count.items():
-            if count > 1:
-                duplicate_names.append(name)
-        return duplicate_names
+    # returns the tree's people counted by birth year, death year, lineage and gender
+    # (see Population), e.g. get_population().alive_by_year(1950, 2120)
+    def get_population(self):
+        return tree_population(self)
+
+    # returns a RelationshipIndex for asking how two people of a finished tree (keep_tree,
+    # columnar or loaded) are related, e.g. get_relationships().relationship(a, b)["name"]
+    def get_relationships(self):
+        return RelationshipIndex(self)
+
+    # returns the full names given to more than one person (counting only the direct
+    # descendants if direct_only), in the order they became duplicates
+    def get_duplicate_names(self, direct_only=False):
+        return self.get_name_index(direct_only).duplicates()
+
+    # returns [(full name, count), ...] for the k most common names, most common first
+    def get_top_names(self, k=10, direct_only=False):
+        return self.get_name_index(direct_only).top(k)
+
+    # returns the DuplicateNameIndex of everyone (or of the direct descendants only), a loaded
+    # tree builds its indexes from the snapshot's name counts on first use
+    def get_name_index(self, direct_only=False):
+        if direct_only:
+            if self.direct_name_index is None:
+                self.direct_name_index = DuplicateNameIndex.from_counts(
+                    self.snapshot_name_counts(direct_only=True)
+                )
+            return self.direct_name_index
+        if self.name_index is None:
+            self.name_index = DuplicateNameIndex.from_counts(self.names_count)
+        return self.name_index
+
+    # returns the {full name: count} dict of a snapshot name counts section
+    def snapshot_name_counts(self, direct_only=False):
+        names = self.store.names
+        return {
+            f"{names[first_name_id]} {names[last_name_id]}": count
+            for first_name_id, last_name_id, count
+            in self.store.name_counts(direct_only).tolist()
+        }
 
 
 def main():
@@ -134,4 +510,5 @@ def main():
             print("None of the above options were selected. Please try again!")
 
 
-main()
+if __name__ == "__main__":
+    main()
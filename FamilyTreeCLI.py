@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import SimulationRunner
+from Demographics import extrapolations
+from FamilyTree import FamilyTree
+from RandomSource import backends, make_rng
+from TreeExport import writers
+
+# the queries of the interactive menu
+queries = {
+    "T": "total_people",
+    "D": "people_by_decade",
+    "N": "duplicate_names",
+    "A": "alive_by_year",
+    "M": "most_common_names",
+}
+
+
+# returns the json description of a person found by a search
+def describe_person(person):
+    return {
+        "first_name": person.get_first_name(),
+        "last_name": person.get_last_name(),
+        "gender": person.get_gender(),
+        "year_born": person.get_year_born(),
+        "year_died": person.get_year_died(),
+        "direct_descendant": person.is_direct_descendant(),
+    }
+
+
+# returns everyone matching a search, "First Last" matches the full name and a single word
+# matches the last name
+def search_tree(tree, text):
+    first_name, _, last_name = text.strip().rpartition(" ")
+    if first_name == "":
+        return tree.index.find_by_last_name(last_name)
+    return tree.index.find_by_name(first_name, last_name)
+
+
+# builds one tree and returns the answers to its queries
+def query_tree(
+        seed, selected="TDN", searches=(), start_year=1950, end_year=2120, batched=False,
+        backend="python", extrapolation="clamp", top=10, direct_only=False, export_path=None,
+        export_format="csv"):
+    if SimulationRunner.worker_factory is None:
+        SimulationRunner.init_worker(quiet=True)
+    SimulationRunner.worker_factory.set_extrapolation(extrapolation)
+    tree = FamilyTree(
+        batched=batched,
+        factory=SimulationRunner.worker_factory,
+        rng=make_rng(seed, backend),
+        indexed=len(searches) > 0,
+        start_year=start_year,
+        end_year=end_year,
+    )
+
+    result = {"seed": seed}
+    if "T" in selected:
+        result[queries["T"]] = tree.get_total_number_of_people()
+    if "D" in selected:
+        result[queries["D"]] = dict(sorted(tree.total_people_by_decade.items()))
+    if "N" in selected:
+        duplicate_names = tree.get_duplicate_names(direct_only)
+        result[queries["N"]] = {"count": len(duplicate_names), "names": duplicate_names}
+    if "A" in selected:
+        result[queries["A"]] = tree.get_population().alive_by_year(start_year, end_year)
+    if "M" in selected:
+        result[queries["M"]] = [
+            {"name": name, "count": count} for name, count in tree.get_top_names(top, direct_only)
+        ]
+    if len(searches) > 0:
+        result["search"] = {
+            text: [describe_person(person) for person in search_tree(tree, text)]
+            for text in searches
+        }
+    if not export_path is None:
+        result["export"] = {"path": export_path, "rows": tree.export(export_path, export_format)}
+    return result
+
+
+# returns the command line parser, the defaults build one tree like the interactive FamilyTree
+def make_parser():
+    parser = argparse.ArgumentParser(
+        description="Generate family trees and answer the T/D/N queries (and searches) as json"
+    )
+    parser.add_argument(
+        "--start-year", type=int, default=1950,
+        help="birth year of the first couple (years before the data files follow --extrapolation)",
+    )
+    parser.add_argument(
+        "--end-year", type=int, default=2120, help="nobody is born after this year"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="master seed, every tree gets a seed derived from it"
+    )
+    parser.add_argument("--trees", type=int, default=1, help="number of trees")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="worker processes (0 for one per cpu)"
+    )
+    parser.add_argument("--backend", choices=sorted(backends), default="python")
+    parser.add_argument(
+        "--extrapolation", choices=extrapolations, default="clamp",
+        help="how years past the data files are handled: the nearest covered year, a linear "
+        "trend, or an error",
+    )
+    parser.add_argument("--batched", action="store_true", help="use the batch generation api")
+    parser.add_argument(
+        "--queries", default="TDN",
+        help="which queries to answer: (T)otal, by (D)ecade, duplicated (N)ames, (A)live by "
+        "year, (M)ost common names",
+    )
+    parser.add_argument("--top", type=int, default=10, help="how many names M reports")
+    parser.add_argument(
+        "--direct-only", action="store_true",
+        help="only count direct descendants for the N and M queries",
+    )
+    parser.add_argument(
+        "--search", action="append", default=[],
+        help='find people by "First Last" or by last name, can be repeated',
+    )
+    parser.add_argument(
+        "--format", choices=["json", "jsonl"], default="json",
+        help="one json document, or one json line per tree",
+    )
+    parser.add_argument("--out", default=None, help="write results here instead of stdout")
+    parser.add_argument(
+        "--export-dir", default=None, help="also write every tree's people to this directory"
+    )
+    parser.add_argument("--export-format", choices=sorted(writers), default="csv")
+    return parser
+
+
+# parses and checks the command line
+def parse_args(argv=None, parser=None):
+    if parser is None:
+        parser = make_parser()
+    args = parser.parse_args(argv)
+
+    unknown = set(args.queries.upper()) - set(queries)
+    if len(unknown) > 0:
+        parser.error(f"unknown queries {''.join(sorted(unknown))}, expected some of {''.join(queries)}")
+    if args.trees < 1:
+        parser.error("--trees must be at least 1")
+    if args.top < 1:
+        parser.error("--top must be at least 1")
+    if args.end_year < args.start_year:
+        parser.error("--end-year must not be before --start-year")
+    return args
+
+
+# runs every tree (in worker processes if asked) and returns the results in seed order
+def run(args):
+    seeds = SimulationRunner.derive_seeds(args.seed, args.trees)
+    export_paths = [None] * len(seeds)
+    if not args.export_dir is None:
+        os.makedirs(args.export_dir, exist_ok=True)
+        export_paths = [
+            os.path.join(args.export_dir, f"tree_{i}.{args.export_format}")
+            for i in range(len(seeds))
+        ]
+    options = (
+        args.queries.upper(), tuple(args.search), args.start_year, args.end_year, args.batched,
+        args.backend, args.extrapolation, args.top, args.direct_only,
+    )
+    workers = args.workers if args.workers > 0 else os.cpu_count() or 1
+    if workers <= 1 or len(seeds) == 1:
+        return [
+            query_tree(seed, *options, export_path, args.export_format)
+            for seed, export_path in zip(seeds, export_paths)
+        ]
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=SimulationRunner.init_worker, initargs=(True,)
+    ) as executor:
+        return list(
+            executor.map(
+                query_tree,
+                seeds,
+                *([option] * len(seeds) for option in options),
+                export_paths,
+                [args.export_format] * len(seeds),
+            )
+        )
+
+
+def main(argv=None):
+    parser = make_parser()
+    args = parse_args(argv, parser)
+    try:
+        results = run(args)
+    except ValueError as error:
+        # e.g. --extrapolation error with years the data files do not cover
+        parser.error(str(error))
+    if args.format == "jsonl":
+        text = "".join(json.dumps(result) + "\n" for result in results)
+    else:
+        parameters = {
+            "start_year": args.start_year,
+            "end_year": args.end_year,
+            "seed": args.seed,
+            "trees": args.trees,
+            "backend": args.backend,
+            "batched": args.batched,
+            "extrapolation": args.extrapolation,
+        }
+        text = json.dumps({"parameters": parameters, "trees": results}, indent=2) + "\n"
+    if args.out is None:
+        sys.stdout.write(text)
+    else:
+        with open(args.out, "w") as file:
+            file.write(text)
+
+
+if __name__ == "__main__":
+    main()
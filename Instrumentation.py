@@ -0,0 +1,135 @@
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+
+# methods timed when instrumentation is attached, as (owner, method, phase)
+# times are inclusive, e.g. make_children includes the samplers it calls
+timed_methods = [
+    ("factory", "get_year_died", "sample_year_died"),
+    ("factory", "get_gender", "sample_gender"),
+    ("factory", "get_first_name_id", "sample_first_name"),
+    ("factory", "get_last_name_id", "sample_last_name"),
+    ("factory", "generate_person", "generate_person"),
+    ("factory", "draw_partner_year", "partner_generation"),
+    ("factory", "plan_children", "child_generation"),
+    ("factory", "make_children", "child_generation"),
+    ("factory", "generate_people", "batch_sampling"),
+    ("factory", "draw_partner_years", "partner_generation"),
+    ("factory", "make_partners", "partner_generation"),
+    ("factory", "plan_children_batch", "child_generation"),
+    ("factory", "make_children_batch", "child_generation"),
+    ("tree", "update_family_stats", "stats_update"),
+    ("tree", "add_person", "add_person"),
+]
+
+
+class Instrumentation:
+    # per-phase timers and counters for one generation run
+    # nothing is wrapped until attach, so a tree without instrumentation pays nothing
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self.queue_depths = []
+        self.generation_end = None
+        self.wrapped = []
+        self.start_time = None
+        self.end_time = None
+        self.people = 0
+
+    # wraps the hot methods of a tree and its factory with timers
+    def attach(self, tree):
+        owners = {"tree": tree, "factory": tree.factory}
+        for owner_name, method_name, phase in timed_methods:
+            owner = owners[owner_name]
+            self.wrapped.append((owner, method_name))
+            setattr(owner, method_name, self.timed(getattr(owner, method_name), phase))
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    # returns fn wrapped so its time and calls are added to phase
+    def timed(self, fn, phase):
+        seconds = self.seconds
+        calls = self.calls
+        seconds.setdefault(phase, 0.0)
+        calls.setdefault(phase, 0)
+        perf_counter = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                seconds[phase] += perf_counter() - start
+                calls[phase] += 1
+
+        return wrapper
+
+    # removes the timers again
+    def detach(self):
+        for owner, method_name in self.wrapped:
+            delattr(owner, method_name)
+        self.wrapped = []
+
+    # called by the tree for every person taken off the BFS queue, records each
+    # generation's size (the queue depth when the generation starts)
+    def record_pop(self, person, queue):
+        if self.generation_end is None:
+            self.queue_depths.append(len(queue) + 1)
+            self.generation_end = queue[-1] if len(queue) > 0 else person
+        if person is self.generation_end:
+            self.generation_end = None
+
+    # called by the tree for every generation of the batch api
+    def record_generation(self, generation):
+        self.queue_depths.append(len(generation))
+
+    # stops the clock and detaches from the tree, only the first call after attach counts
+    def finish(self, tree):
+        if not self.end_time is None:
+            return
+        self.end_time = time.perf_counter()
+        self.people = tree.get_total_number_of_people()
+        self.detach()
+
+    # returns the collected numbers as a dict
+    def report(self):
+        end_time = self.end_time if not self.end_time is None else time.perf_counter()
+        elapsed = end_time - self.start_time if not self.start_time is None else 0.0
+        return {
+            "seconds": elapsed,
+            "people": self.people,
+            "people_per_second": self.people / elapsed if elapsed > 0 else 0.0,
+            "phase_seconds": dict(self.seconds),
+            "phase_calls": dict(self.calls),
+            "queue_depth_per_generation": list(self.queue_depths),
+        }
+
+
+# runs fn under cProfile, writes the stats sorted by cumulative time to path and returns fn's result
+def profile_run(fn, path, limit=40):
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(limit)
+    with open(path, "w") as file:
+        file.write(report.getvalue())
+    return result
+
+
+# runs fn under tracemalloc, writes the peak and top allocation sites to path and returns fn's result
+def trace_memory_run(fn, path, limit=25):
+    tracemalloc.start()
+    try:
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    with open(path, "w") as file:
+        file.write(f"current: {current} bytes\npeak: {peak} bytes\n\n")
+        for stat in snapshot.statistics("lineno")[:limit]:
+            file.write(f"{stat}\n")
+    return result
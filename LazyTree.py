@@ -0,0 +1,149 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from Person import Person
+from PersonFactory import PersonFactory
+from RandomSource import make_rng
+
+
+class LazyPerson(Person):
+    # a Person whose partner and children are only generated when first asked for
+    __slots__ = ("tree", "path", "spouse", "expanded")
+
+    def __init__(self, tree, path, person, parent=None, spouse=None):
+        super().__init__(
+            year_born=person.get_year_born(),
+            year_died=person.get_year_died(),
+            first_name=person.get_first_name(),
+            last_name=person.get_last_name(),
+            direct_descendant=person.is_direct_descendant(),
+            parent=parent,
+            gender=person.get_gender(),
+        )
+        self.tree = tree
+        # child numbers from the root down to this person (None for partners)
+        self.path = path
+        # the descendant a generated partner married, their family is generated by them
+        self.spouse = spouse
+        self.expanded = False
+
+    # return this person's partner (object), generating it if needed
+    def get_partner(self):
+        if self.spouse is None and not self.expanded:
+            self.tree.expand(self)
+        return self.partner
+
+    # return an array containing this person's children, generating them if needed
+    def get_children(self):
+        if not self.spouse is None:
+            return self.spouse.get_children()
+        if not self.expanded:
+            self.tree.expand(self)
+        return self.children
+
+
+class LazyTree:
+    # a tree that generates each person's family the first time it is accessed
+    # every person's family comes from their own random stream derived from their path,
+    # so the tree is the same whatever order it is explored in
+
+    def __init__(self, seed=0, backend="python", end_year=2120, factory=None, max_expanded=None):
+        if factory is None:
+            factory = PersonFactory()
+        self.factory = factory
+        self.seed = seed
+        self.backend = backend
+        self.end_year = end_year
+        # keep at most this many expanded people, evicting the least recently used ones
+        self.max_expanded = max_expanded
+        self.expanded = OrderedDict()
+
+        # generate the first two people
+        self.use_rng((0,))
+        founders = [
+            self.factory.generate_person(1950, is_direct_descendent=False),
+            self.factory.generate_person(1950, is_direct_descendent=False),
+        ]
+        self.first_people = [LazyPerson(self, (), founders[0]), LazyPerson(self, None, founders[1])]
+        self.first_people[0].set_partner(self.first_people[1])
+        self.first_people[1].set_partner(self.first_people[0])
+        self.first_people[1].spouse = self.first_people[0]
+        self.first_people[0].set_is_direct_descendant(True)
+        self.first_people[1].set_is_direct_descendant(True)
+
+    # points the factory at the random stream for spawn_key
+    def use_rng(self, spawn_key):
+        seed_sequence = np.random.SeedSequence(self.seed, spawn_key=spawn_key)
+        seed = int(seed_sequence.generate_state(1, dtype=np.uint64)[0])
+        self.factory.set_rng(make_rng(seed, self.backend))
+        self.factory.set_end_year(self.end_year)
+
+    # generates a person's partner and children (from the person's own random stream)
+    def expand(self, person):
+        if person.expanded:
+            return
+        self.use_rng((1, len(person.path)) + person.path)
+        self.factory.set_first_people(self.first_people)
+
+        # generate their spouse
+        if person.partner is None:
+            partner_year_born = self.factory.draw_partner_year(person.get_year_born())
+            if not partner_year_born is None:
+                partner = self.factory.generate_person(
+                    partner_year_born, is_direct_descendent=False
+                )
+                if not partner is None:
+                    person.set_partner(LazyPerson(self, None, partner, spouse=person))
+
+        # generate their children
+        plan = self.factory.plan_children(
+            year_born=person.get_year_born(),
+            parent1=person,
+            parent2=person.partner,
+        )
+        children = self.factory.make_children(plan, person.is_direct_descendant())
+        person.set_children(
+            [
+                LazyPerson(self, person.path + (i,), child, parent=person)
+                for i, child in enumerate(children)
+            ]
+        )
+        person.expanded = True
+        self.remember(person)
+
+    # marks a person (and their ancestors) as recently used, evicting old families if needed
+    # the person's own line is never evicted, even if it is longer than max_expanded
+    def remember(self, person):
+        if self.max_expanded is None:
+            return
+        line = []
+        ancestor = person.get_parent()
+        while not ancestor is None:
+            if ancestor.path in self.expanded:
+                line.append(ancestor.path)
+            ancestor = ancestor.get_parent()
+        for path in reversed(line):
+            self.expanded.move_to_end(path)
+        self.expanded[person.path] = person
+        line = len(line) + 1
+        while len(self.expanded) > max(self.max_expanded, line):
+            path, evicted = next(iter(self.expanded.items()))
+            self.evict(evicted)
+
+    # forgets a person's generated family (and everything below it), it is regenerated identically on access
+    def evict(self, person):
+        depth = len(person.path)
+        for path in [path for path in self.expanded if path[:depth] == person.path]:
+            del self.expanded[path]
+        if not person is self.first_people[0]:
+            person.set_partner(None)
+        person.set_children(None)
+        person.expanded = False
+
+    # returns the person at a path of child numbers from the first person
+    def find(self, path):
+        person = self.first_people[0]
+        for i in path:
+            person = person.get_children()[i]
+        return person
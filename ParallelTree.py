@@ -0,0 +1,136 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import SimulationRunner
+from FamilyTree import FamilyTree
+from Person import Person
+from RandomSource import make_rng
+
+
+# returns a plain tuple describing a person, safe to send to another process
+def person_fields(person):
+    return (
+        person.get_year_born(),
+        person.get_year_died(),
+        person.get_first_name(),
+        person.get_last_name(),
+        person.is_direct_descendant(),
+        person.get_gender(),
+    )
+
+
+# returns an unlinked copy of a person built from person_fields
+def person_from_fields(fields):
+    year_born, year_died, first_name, last_name, direct_descendant, gender = fields
+    return Person(
+        year_born=year_born,
+        year_died=year_died,
+        first_name=first_name,
+        last_name=last_name,
+        direct_descendant=direct_descendant,
+        gender=gender,
+    )
+
+
+# returns an integer seed from a SeedSequence
+def seed_from(seed_sequence):
+    return int(seed_sequence.generate_state(1, dtype=np.uint64)[0])
+
+
+# grows the subtree below one frontier person in a worker process
+def grow_subtree(
+        root_fields, first_people_fields, seed, batched=False, backend="python", end_year=2120,
+        aggregators=None):
+    if SimulationRunner.worker_factory is None:
+        SimulationRunner.init_worker()
+    factory = SimulationRunner.worker_factory
+
+    root = person_from_fields(root_fields)
+    first_people = [person_from_fields(fields) for fields in first_people_fields]
+    subtree = FamilyTree(
+        batched=batched,
+        factory=factory,
+        subtree_root=root,
+        first_people=first_people,
+        rng=make_rng(seed, backend),
+        end_year=end_year,
+        aggregators=None if aggregators is None else [a.empty() for a in aggregators],
+    )
+    # the factory (and its data frames) stays in the worker
+    subtree.factory = None
+    subtree.first_people = []
+    return root, subtree
+
+
+# builds one tree, generating the first split_depth generations serially and
+# every subtree below that frontier in its own worker process with its own seed
+# aggregators (see Aggregators) are fed by every part and merged into the returned tree
+def generate_tree_parallel(
+        split_depth=2, workers=None, seed=0, batched=False, backend="python", end_year=2120,
+        aggregators=None):
+    seed_sequence = np.random.SeedSequence(seed)
+    tree = FamilyTree(
+        stream=True,
+        rng=make_rng(seed_from(seed_sequence.spawn(1)[0]), backend),
+        end_year=end_year,
+        aggregators=aggregators,
+    )
+
+    # serial part: the root couple and the first generations
+    generations = tree.stream_generations(keep_tree=True)
+    for _ in range(split_depth):
+        if next(generations, None) is None:
+            break
+    frontier = list(tree.people_queue)
+    tree.people_queue.clear()
+    if len(frontier) == 0:
+        return tree
+
+    first_people_fields = [person_fields(person) for person in tree.first_people]
+    seeds = [seed_from(child) for child in seed_sequence.spawn(len(frontier))]
+    root_fields = [person_fields(person) for person in frontier]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        results = [
+            grow_subtree(
+                fields, first_people_fields, subtree_seed, batched, backend, end_year, aggregators
+            )
+            for fields, subtree_seed in zip(root_fields, seeds)
+        ]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=SimulationRunner.init_worker
+        ) as executor:
+            results = list(
+                executor.map(
+                    grow_subtree,
+                    root_fields,
+                    [first_people_fields] * len(frontier),
+                    seeds,
+                    [batched] * len(frontier),
+                    [backend] * len(frontier),
+                    [end_year] * len(frontier),
+                    [aggregators] * len(frontier),
+                )
+            )
+
+    # graft every subtree onto the frontier person it was grown from
+    for person, (root, subtree) in zip(frontier, results):
+        partner = root.get_partner()
+        children = root.get_children()
+        person.set_partner(partner)
+        person.set_children(children)
+        if not partner is None:
+            partner.set_partner(person)
+            partner.set_children(children)
+        for child in children:
+            child.set_parent(person)
+        tree.merge_stats(subtree)
+        for cut_person, partner_year_born, plan, next_child in subtree.cut_off:
+            if cut_person is root:
+                cut_person = person
+            tree.cut_off.append((cut_person, partner_year_born, plan, next_child))
+    return tree
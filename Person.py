@@ -1,4 +1,23 @@
 class Person:
+    # people are kept small: fixed slots instead of a __dict__, names as ids into the shared
+    # name table below and children as a tuple that both partners share
+    __slots__ = (
+        "year_born",
+        "year_died",
+        "first_name_id",
+        "last_name_id",
+        "partner",
+        "parent",
+        "children",
+        "direct_descendant",
+        "gender",
+    )
+
+    # name table shared by every Person, PersonFactory interns all the names it samples from
+    names = []
+    name_ids = {}
+    # one shared int object per year, so people do not each hold their own copies
+    years = {}
 
     def __init__(
             self,
@@ -9,15 +28,76 @@ class Person:
             direct_descendant,
             partner=None,
             parent=None,
-            children=None):
+            children=None,
+            gender=None):
         self.year_born = year_born
         self.year_died = year_died
-        self.first_name = first_name
-        self.last_name = last_name
+        self.first_name_id = self.intern_name(first_name)
+        self.last_name_id = self.intern_name(last_name)
         self.partner = partner
         self.parent = parent
-        self.children = children
+        self.set_children(children)
         self.direct_descendant = direct_descendant
+        self.gender = gender
+
+    # returns a Person whose names are already ids from intern_name (skips the lookups)
+    @classmethod
+    def from_ids(
+            cls, year_born, year_died, first_name_id, last_name_id, direct_descendant, gender=None):
+        years = cls.years
+        person = cls.__new__(cls)
+        person.year_born = years.setdefault(year_born, year_born)
+        person.year_died = years.setdefault(year_died, year_died)
+        person.first_name_id = first_name_id
+        person.last_name_id = last_name_id
+        person.partner = None
+        person.parent = None
+        person.children = None
+        person.direct_descendant = direct_descendant
+        person.gender = gender
+        return person
+
+    # people are pickled (e.g. sent back from ParallelTree workers) with their names as strings,
+    # since every process fills its own name table and the ids differ between them
+    def __getstate__(self):
+        return (
+            self.year_born,
+            self.year_died,
+            self.names[self.first_name_id],
+            self.names[self.last_name_id],
+            self.partner,
+            self.parent,
+            self.children,
+            self.direct_descendant,
+            self.gender,
+        )
+
+    def __setstate__(self, state):
+        (
+            year_born,
+            year_died,
+            first_name,
+            last_name,
+            self.partner,
+            self.parent,
+            self.children,
+            self.direct_descendant,
+            self.gender,
+        ) = state
+        self.year_born = self.years.setdefault(year_born, year_born)
+        self.year_died = self.years.setdefault(year_died, year_died)
+        self.first_name_id = self.intern_name(first_name)
+        self.last_name_id = self.intern_name(last_name)
+
+    # returns the id of name in the shared name table, adding it if it is new
+    @classmethod
+    def intern_name(cls, name):
+        name_id = cls.name_ids.get(name)
+        if name_id is None:
+            name_id = len(cls.names)
+            cls.names.append(name)
+            cls.name_ids[name] = name_id
+        return name_id
 
     # return the year this person was born
     def get_year_born(self):
@@ -37,19 +117,19 @@ class Person:
 
     # return this person's first name
     def get_first_name(self):
-        return self.first_name
+        return self.names[self.first_name_id]
 
     # set this person's first name
     def set_first_name(self, name):
-        self.first_name = name
+        self.first_name_id = self.intern_name(name)
 
     # return this person's last name
     def get_last_name(self):
-        return self.last_name
+        return self.names[self.last_name_id]
 
     # set this person's last name
     def set_last_name(self, name):
-        self.last_name = name
+        self.last_name_id = self.intern_name(name)
 
     # return this person's partner (object)
     def get_partner(self):
@@ -63,9 +143,12 @@ class Person:
     def get_children(self):
         return self.children
 
-    # set this person's children
+    # set this person's children (kept as a tuple, pass a partner's tuple to share it)
     def set_children(self, children):
-        self.children = children
+        if children is None or type(children) is tuple:
+            self.children = children
+        else:
+            self.children = tuple(children)
 
     # return this person's parent
     def get_parent(self):
@@ -82,3 +165,11 @@ class Person:
     # return if this person is a direct descendant
     def is_direct_descendant(self):
         return self.direct_descendant
+
+    # return this person's gender ("male", "female" or None if unknown)
+    def get_gender(self):
+        return self.gender
+
+    # set this person's gender
+    def set_gender(self, gender):
+        self.gender = gender
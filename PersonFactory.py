@@ -1,85 +1,288 @@
-import pandas as pd
-import random
-import math
+import numpy as np
+from bisect import bisect
+from itertools import accumulate
 
+from DataTables import load_tables
+from Demographics import Demographics
 from Person import Person
+from RandomSource import make_rng
 
 
 class PersonFactory:
     first_people = []
 
-    def __init__(self):
+    def __init__(
+            self, rng=None, end_year=2120, extrapolation="clamp", birth_scale=1.0,
+            marriage_scale=1.0):
+        # source of all randomness, see RandomSource
+        if rng is None:
+            rng = make_rng()
+        self.rng = rng
+        # nobody is born after end_year
+        self.end_year = end_year
+        # how years the data files do not cover are handled, see Demographics
+        self.extrapolation = extrapolation
+        # every birth/marriage rate is multiplied by these (for scenario runs)
+        self.birth_scale = birth_scale
+        self.marriage_scale = marriage_scale
         # read all files
         self.read_files()
         return
 
+    def set_rng(self, rng):
+        self.rng = rng
+
+    def set_end_year(self, end_year):
+        self.demographics.cover(self.demographics.first_year, end_year)
+        self.end_year = end_year
+
+    # rebuilds the per-year parameters with another extrapolation (see Demographics)
+    def set_extrapolation(self, extrapolation):
+        self.update_demographics(extrapolation=extrapolation)
+
+    # scales every birth and marriage rate, e.g. 1.1 for 10% more
+    def set_rate_scales(self, birth_scale=1.0, marriage_scale=1.0):
+        self.update_demographics(birth_scale=birth_scale, marriage_scale=marriage_scale)
+
+    # changes demographic options and rebuilds the per-year parameters if any changed, the old
+    # options are kept if the new ones are invalid
+    def update_demographics(self, **options):
+        previous = {option: getattr(self, option) for option in options}
+        if previous == options:
+            return
+        for option, value in options.items():
+            setattr(self, option, value)
+        try:
+            self.demographics = self.build_demographics()
+        except ValueError:
+            for option, value in previous.items():
+                setattr(self, option, value)
+            raise
+
     def set_first_people(self, first_people):
         self.first_people = first_people
 
-    # reads in all data files into their own df
+    # reads in all data files (through the cache in DataTables)
     def read_files(self):
         print("reading files!")
-        self.first_names_df = pd.read_csv("first_names.csv")
-        self.last_names_df = pd.read_csv("last_names.csv")
-        self.birth_marriage_df = pd.read_csv("birth_and_marriage_rates.csv")
-        self.life_expectancy_df = pd.read_csv("life_expectancy.csv")
-        self.rank_probability_df = pd.read_csv("rank_to_probability.csv", header=None).T
+        self.tables = load_tables()
+        self.compile_tables()
+
+    # builds the lookup tables used while sampling so no df is filtered per person
+    def compile_tables(self):
+        # life expectancy by birth year (truncated like the original int() call)
+        self.life_expectancy = dict(self.tables["life_expectancy"])
+
+        # (birth rate, marriage rate) by decade
+        self.rates = dict(self.tables["rates"])
+
+        # names are sampled as ids into the name table shared with Person
+        self.names = Person.names
+        intern_name = Person.intern_name
+
+        # gender alias tables by decade
+        self.genders = []
+        self.gender_tables = {}
+        for decade, probabilities in self.tables["gender_probability"].items():
+            for gender in probabilities:
+                if not gender in self.genders:
+                    self.genders.append(gender)
+            self.gender_tables[decade] = self.build_alias_table(
+                list(probabilities), list(probabilities.values())
+            )
+
+        # first name id alias tables by (decade, gender)
+        first_names = {}
+        for decade, rows in self.tables["first_names"].items():
+            for gender, name, frequency in rows:
+                names, frequencies = first_names.setdefault((decade, gender), ([], []))
+                names.append(intern_name(name))
+                frequencies.append(frequency)
+        self.first_name_tables = {
+            key: self.build_alias_table(names, frequencies)
+            for key, (names, frequencies) in first_names.items()
+        }
+
+        # last name ids with cumulative rank probabilities by decade, in file order
+        probability = self.tables["rank_probability"]
+        self.last_name_tables = {}
+        for decade, names in self.tables["last_names"].items():
+            self.last_name_tables[decade] = self.build_table(
+                [intern_name(name) for name in names], probability
+            )
+
+        # rates, life expectancy and tables by birth year, resolved once
+        self.demographics = self.build_demographics()
+
+        # array versions of the tables for the batch api
+        # the batch api draws gender and first name together, from one alias table per decade
+        # over (gender, name) with weight P(gender) * P(name | gender), values are indexes into
+        # first_name_genders and first_name_ids
+        self.first_name_arrays = {}
+        for decade, gender_probabilities in self.tables["gender_probability"].items():
+            pairs = []
+            weights = []
+            for gender, gender_probability in gender_probabilities.items():
+                names, frequencies = first_names[(decade, gender)]
+                total = sum(frequencies)
+                for name_id, frequency in zip(names, frequencies):
+                    pairs.append((self.genders.index(gender), name_id))
+                    weights.append(gender_probability * frequency / total)
+            self.first_name_arrays[decade] = (
+                self.build_array_alias_table(self.build_alias_table(list(range(len(pairs))), weights)),
+                np.array([gender for gender, name_id in pairs], dtype=np.int64),
+                np.array([name_id for gender, name_id in pairs], dtype=np.int64),
+            )
+        self.last_name_arrays = {
+            decade: self.build_array_table(table)
+            for decade, table in self.last_name_tables.items()
+        }
+
+    # returns the Demographics of every birth year from the first year the data covers to
+    # end_year (or further on demand)
+    def build_demographics(self):
+        name_tables = {
+            decade: (
+                gender_table,
+                {
+                    gender: self.first_name_tables[(decade, gender)]
+                    for gender in self.genders
+                    if (decade, gender) in self.first_name_tables
+                },
+                self.last_name_tables[decade],
+            )
+            for decade, gender_table in self.gender_tables.items()
+        }
+        first_year = min(self.life_expectancy)
+        return Demographics(
+            self.life_expectancy,
+            self.rates,
+            name_tables,
+            first_year,
+            max(self.end_year, first_year),
+            self.extrapolation,
+            birth_scale=self.birth_scale,
+            marriage_scale=self.marriage_scale,
+        )
+
+    # returns a (values, cumulative weights, total weight) table for weighted sampling
+    @staticmethod
+    def build_table(values, weights):
+        cum_weights = list(accumulate(weights))
+        return values, cum_weights, cum_weights[-1]
+
+    # returns a numpy copy of a table built by build_table
+    @staticmethod
+    def build_array_table(table):
+        values, cum_weights, total = table
+        return np.array(values, dtype=np.int64), np.array(cum_weights), total
+
+    # picks a value from a table built by build_table (same draw as choices)
+    def sample_table(self, table):
+        values, cum_weights, total = table
+        return values[bisect(cum_weights, self.rng.random() * total, 0, len(cum_weights) - 1)]
+
+    # returns a (values, probabilities, alias values) table for O(1) weighted sampling (Walker's
+    # alias method): slot i holds values[i] with probabilities[i], else its alias value
+    @staticmethod
+    def build_alias_table(values, weights):
+        n = len(weights)
+        total = sum(weights)
+        scaled = [weight * n / total for weight in weights]
+        probabilities = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, weight in enumerate(scaled) if weight < 1]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1]
+        while not len(small) == 0 and not len(large) == 0:
+            less = small.pop()
+            more = large.pop()
+            probabilities[less] = scaled[less]
+            alias[less] = more
+            scaled[more] += scaled[less] - 1
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+        return values, probabilities, [values[i] for i in alias]
+
+    # returns a numpy copy of a table built by build_alias_table
+    @staticmethod
+    def build_array_alias_table(table):
+        values, probabilities, alias_values = table
+        return (
+            np.array(values, dtype=np.int64),
+            np.array(probabilities),
+            np.array(alias_values, dtype=np.int64),
+        )
+
+    # picks a value from a table built by build_alias_table with one uniform draw
+    def sample_alias_table(self, table):
+        values, probabilities, alias_values = table
+        u = self.rng.random() * len(values)
+        i = min(int(u), len(values) - 1)
+        if u - i < probabilities[i]:
+            return values[i]
+        return alias_values[i]
 
     # returns a year of death based on their birth year
     def get_year_died(self, year_born):
-        sel_rows = self.life_expectancy_df[self.life_expectancy_df["Year"] == year_born]
-        life_expectancy = int(sel_rows["Period life expectancy at birth"].values[0])
-        return random.randint(
+        life_expectancy = self.demographics.get(year_born).life_expectancy
+        return self.rng.randint(
             year_born + (life_expectancy - 10), year_born + (life_expectancy + 10)
         )
 
-    # returns a first name based on their birth year
-    def get_first_name(self, year_born):
-        decade = f"{math.floor(year_born / 10 ) * 10}s"
-        sel_rows = self.first_names_df[self.first_names_df["decade"] == decade]
-        first_names = sel_rows["name"].tolist()
-        frequencies = sel_rows["frequency"].tolist()
-        return random.choices(first_names, frequencies)[0]
+    # returns a gender based on their birth year
+    def get_gender(self, year_born):
+        return self.sample_alias_table(self.demographics.get(year_born).gender_table)
+
+    # returns a first name based on their birth year and gender (drawn if not given)
+    def get_first_name(self, year_born, gender=None):
+        return self.names[self.get_first_name_id(year_born, gender)]
+
+    # returns the id of a first name based on their birth year and gender (drawn if not given)
+    def get_first_name_id(self, year_born, gender=None):
+        parameters = self.demographics.get(year_born)
+        if gender is None:
+            gender = self.sample_alias_table(parameters.gender_table)
+        return self.sample_alias_table(parameters.first_name_tables[gender])
 
     # returns one of the two last names if they are direct descendants or one based off of their birth year
     def get_last_name(self, direct_descendant, year_born):
+        return self.names[self.get_last_name_id(direct_descendant, year_born)]
+
+    # returns the id of a last name, see get_last_name
+    def get_last_name_id(self, direct_descendant, year_born):
         if direct_descendant:
-            return random.choice(
-                [
-                    self.first_people[0].get_last_name(),
-                    self.first_people[1].get_last_name(),
-                ]
-            )
+            return self.rng.choice(self.root_name_ids())
         else:
-            decade = f"{math.floor(year_born / 10 ) * 10}s"
-            sel_rows = self.last_names_df[self.last_names_df["Decade"] == decade]
-            last_names = sel_rows["LastName"].tolist()
-            probability = self.rank_probability_df[0].tolist()
-            return random.choices(last_names, probability)[0]
+            return self.sample_table(self.demographics.get(year_born).last_name_table)
+
+    # returns the ids of the two first people's last names
+    def root_name_ids(self):
+        return [
+            Person.intern_name(self.first_people[0].get_last_name()),
+            Person.intern_name(self.first_people[1].get_last_name()),
+        ]
+
+    # calculates if a person has a partner based on their birth year and returns their partner's birth year or None
+    def draw_partner_year(self, year_born):
+        probability = self.demographics.get(year_born).marriage_rate
+        if self.rng.random() < probability:
+            return self.rng.randint(year_born - 10, year_born + 10)
+        return None
 
     # calculates if a person has a partner based on their birth year and returns a Person object (partner) or None
     def generate_partner(self, year_born):
-        decade = f"{math.floor(year_born / 10 ) * 10}s"
-        sel_rows = self.birth_marriage_df[self.birth_marriage_df["decade"] == decade]
-        probability = sel_rows["marriage_rate"].values[0]
-        if random.choices([True, False], [probability, 1 - probability]):
-            partner_year_born = random.randint(year_born - 10, year_born + 10)
-            if partner_year_born > 2120:
-                return None
-            return self.generate_person(
-                year_born=partner_year_born, is_direct_descendent=False
-            )
+        partner_year_born = self.draw_partner_year(year_born)
+        if partner_year_born is None:
+            return None
+        return self.generate_person(year_born=partner_year_born, is_direct_descendent=False)
 
-    # returns an array with People objects (children) with their birth year based on the eldest parent's birth year (can be an empty array)
-    def get_children(self, year_born, parent1, parent2, direct_descendant):
-        # calculate and format into a decade
-        decade = f"{math.floor(year_born / 10 ) * 10}s"
+    # returns (first child's birth year, years between children, num of children) for a couple
+    def plan_children(self, year_born, parent1, parent2):
         # retrieve num of children
-        sel_rows = self.birth_marriage_df[self.birth_marriage_df["decade"] == decade]
-        birth_rate = float(sel_rows["birth_rate"].values[0])
-        num_children = random.randrange(
-            round(birth_rate - 1.5), round(birth_rate + 1.5)
-        )
+        parameters = self.demographics.get(year_born)
+        num_children = self.rng.randrange(parameters.children_low, parameters.children_high)
 
         # find eldest parent if there are two parents
         eldest_parent = parent1
@@ -95,29 +298,174 @@ class PersonFactory:
                 eldest_parent.get_year_born() + 45,
             ]
             distribution = round((birth_range[1] - birth_range[0]) / (num_children - 1))
+        return eldest_parent.get_year_born() + 25, distribution, num_children
 
-        # generate children
+    # returns the children of a plan from plan_children, starting at child number start,
+    # up to the first one born after end_year
+    def make_children(self, plan, direct_descendant, start=0):
+        first_birth_year, distribution, num_children = plan
         children = []
-        for i in range(num_children):
-            birth_year = (eldest_parent.get_year_born() + 25) + (i * distribution)
-            if birth_year > 2120:
+        for i in range(start, num_children):
+            birth_year = first_birth_year + (i * distribution)
+            if birth_year > self.end_year:
                 return children
             children.append(
                 self.generate_person(birth_year, is_direct_descendent=direct_descendant)
             )
         return children
 
+    # returns an array with People objects (children) with their birth year based on the eldest parent's birth year (can be an empty array)
+    def get_children(self, year_born, parent1, parent2, direct_descendant):
+        return self.make_children(self.plan_children(year_born, parent1, parent2), direct_descendant)
+
     # returns a Person object
     def generate_person(self, year_born, is_direct_descendent):
-        if year_born > 2120:
+        if year_born > self.end_year:
             return None
         year_died = self.get_year_died(year_born)
-        first_name = self.get_first_name(year_born)
-        last_name = self.get_last_name(is_direct_descendent, year_born)
-        return Person(
-            year_born=year_born,
-            year_died=year_died,
-            first_name=first_name,
-            last_name=last_name,
-            direct_descendant=is_direct_descendent
+        gender = self.get_gender(year_born)
+        first_name_id = self.get_first_name_id(year_born, gender)
+        last_name_id = self.get_last_name_id(is_direct_descendent, year_born)
+        return Person.from_ids(
+            year_born, year_died, first_name_id, last_name_id, is_direct_descendent, gender
+        )
+
+    # picks size values from a table built by build_array_table
+    @staticmethod
+    def sample_array_table(table, size, rng):
+        values, cum_weights, total = table
+        picks = np.searchsorted(cum_weights, rng.random(size) * total, side="right")
+        return values[np.minimum(picks, len(cum_weights) - 1)]
+
+    # picks size values from a table built by build_array_alias_table
+    @staticmethod
+    def sample_array_alias_table(table, size, rng):
+        values, probabilities, alias_values = table
+        u = rng.random(size) * len(values)
+        slots = np.minimum(u.astype(np.int64), len(values) - 1)
+        return np.where(u - slots < probabilities[slots], values[slots], alias_values[slots])
+
+    # returns arrays of death years, first name ids, last name ids and genders (indexes into
+    # genders) for a batch of people
+    def generate_people(self, years_born, direct_descendants):
+        rng = self.rng.numpy_generator()
+        years_born = np.asarray(years_born, dtype=np.int64)
+        direct_descendants = np.asarray(direct_descendants, dtype=bool)
+        n = len(years_born)
+
+        year_idx = self.demographics.indexes(years_born)
+        life_expectancy = self.demographics.life_expectancy_array[year_idx]
+        years_died = years_born + (life_expectancy - 10) + rng.integers(0, 21, n)
+
+        first_names = np.empty(n, dtype=np.int64)
+        last_names = np.empty(n, dtype=np.int64)
+        genders = np.empty(n, dtype=np.int64)
+        decades = self.demographics.decade_array[year_idx]
+        for decade in np.unique(decades):
+            in_decade = decades == decade
+            idx = np.flatnonzero(in_decade)
+            table, first_name_genders, first_name_ids = self.first_name_arrays[decade]
+            picks = self.sample_array_alias_table(table, len(idx), rng)
+            genders[idx] = first_name_genders[picks]
+            first_names[idx] = first_name_ids[picks]
+            idx = np.flatnonzero(in_decade & ~direct_descendants)
+            if len(idx) > 0:
+                last_names[idx] = self.sample_array_table(
+                    self.last_name_arrays[decade], len(idx), rng
+                )
+
+        idx = np.flatnonzero(direct_descendants)
+        if len(idx) > 0:
+            root_names = np.array(self.root_name_ids(), dtype=np.int64)
+            last_names[idx] = root_names[rng.integers(0, 2, len(idx))]
+
+        return years_died, first_names, last_names, genders
+
+    # returns a list of Person objects for a batch of birth years
+    def build_people(self, years_born, direct_descendants):
+        years_died, first_names, last_names, genders = self.generate_people(
+            years_born, direct_descendants
+        )
+        from_ids = Person.from_ids
+        gender_names = self.genders
+        return [
+            from_ids(
+                year_born, year_died, first_name_id, last_name_id, direct_descendant,
+                gender_names[gender],
+            )
+            for year_born, year_died, first_name_id, last_name_id, direct_descendant, gender in zip(
+                np.asarray(years_born).tolist(),
+                years_died.tolist(),
+                first_names.tolist(),
+                last_names.tolist(),
+                np.asarray(direct_descendants, dtype=bool).tolist(),
+                genders.tolist(),
+            )
+        ]
+
+    # batch version of draw_partner_year, returns arrays of partner birth years and of whether
+    # each person gets a partner (their partner year means nothing otherwise)
+    def draw_partner_years(self, years_born):
+        rng = self.rng.numpy_generator()
+        years_born = np.asarray(years_born, dtype=np.int64)
+        marriage_rates = self.demographics.marriage_rate_array[self.demographics.indexes(years_born)]
+        married = rng.random(len(years_born)) < marriage_rates
+        return years_born + rng.integers(-10, 11, len(years_born)), married
+
+    # builds the partners for the arrays from draw_partner_years, returns a list of Person
+    # objects or None
+    def make_partners(self, partner_years, married):
+        idx = np.flatnonzero(married & (partner_years <= self.end_year))
+        partners = [None] * len(partner_years)
+        built = self.build_people(partner_years[idx], np.zeros(len(idx), dtype=bool))
+        for i, partner in zip(idx.tolist(), built):
+            partners[i] = partner
+        return partners
+
+    # batch version of generate_partner, returns a list of Person objects or None
+    def generate_partners(self, years_born):
+        return self.make_partners(*self.draw_partner_years(years_born))
+
+    # batch version of plan_children, returns arrays of first birth years, distributions and num of children
+    def plan_children_batch(self, years_born, eldest_years_born):
+        rng = self.rng.numpy_generator()
+        years_born = np.asarray(years_born, dtype=np.int64)
+        eldest_years_born = np.asarray(eldest_years_born, dtype=np.int64)
+
+        # num of children from the decade birth rate
+        year_idx = self.demographics.indexes(years_born)
+        num_children = rng.integers(
+            self.demographics.children_low_array[year_idx],
+            self.demographics.children_high_array[year_idx],
+        )
+
+        # birth years spread evenly over eldest parent's year born + 25 through + 45
+        distribution = np.full(len(years_born), 10, dtype=np.int64)
+        several = num_children > 1
+        distribution[several] = np.round(20 / (num_children[several] - 1)).astype(np.int64)
+        return eldest_years_born + 25, distribution, num_children
+
+    # batch version of make_children, returns a list of children lists (one per parent)
+    def make_children_batch(self, plans, direct_descendants):
+        first_birth_years, distribution, num_children = plans
+        direct_descendants = np.asarray(direct_descendants, dtype=bool)
+        n = len(num_children)
+        parent_idx = np.repeat(np.arange(n), num_children)
+        offsets = np.cumsum(num_children) - num_children
+        order = np.arange(len(parent_idx)) - offsets[parent_idx]
+        child_years = first_birth_years[parent_idx] + order * distribution[parent_idx]
+
+        keep = child_years <= self.end_year
+        parent_idx = parent_idx[keep]
+        built = self.build_people(child_years[keep], direct_descendants[parent_idx])
+
+        children = [[] for _ in range(n)]
+        for i, child in zip(parent_idx.tolist(), built):
+            children[i].append(child)
+        return children
+
+    # batch version of get_children, returns a list of children lists (one per parent)
+    def get_children_batch(self, years_born, eldest_years_born, direct_descendants):
+        return self.make_children_batch(
+            self.plan_children_batch(years_born, eldest_years_born), direct_descendants
         )
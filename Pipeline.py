@@ -0,0 +1,165 @@
+import queue
+import threading
+
+from TreeExport import export_generations, open_writer
+
+# put on a consumer's queue after the last batch
+DONE = object()
+
+
+# groups people from FamilyTree.stream_people into BFS generations (a person's partner is in
+# their batch, their parent in the previous one), the same batches stream_generations yields
+def generation_batches(people):
+    batch = []
+    members = set()
+    for person in people:
+        parent = person.get_parent()
+        if not parent is None and parent in members:
+            yield batch
+            batch = []
+            members = set()
+        batch.append(person)
+        members.add(person)
+    if len(batch) > 0:
+        yield batch
+
+
+class Consumer:
+    # runs in its own thread and reads generation batches (lists of people whose partner and
+    # children have been generated) until generation ends
+
+    # consumes every batch of the iterator
+    def run(self, batches):
+        for batch in batches:
+            self.consume(batch)
+
+    # handles one batch
+    def consume(self, batch):
+        raise NotImplementedError
+
+
+class FunctionConsumer(Consumer):
+    # calls fn(batch) for every batch
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def consume(self, batch):
+        self.fn(batch)
+
+
+class ExportConsumer(Consumer):
+    # writes the people to a file (see TreeExport) while the tree is generated
+
+    def __init__(self, path, format="csv", chunk_size=65536):
+        self.path = path
+        self.format = format
+        self.chunk_size = chunk_size
+        self.rows = 0
+
+    def run(self, batches):
+        with open_writer(self.path, self.format) as writer:
+            self.rows = export_generations(batches, writer, self.chunk_size)
+
+
+class IndexConsumer(Consumer):
+    # fills a TreeIndex while the tree is generated (needs keep_tree for lineage queries)
+
+    def __init__(self, index):
+        self.index = index
+
+    def consume(self, batch):
+        for person in batch:
+            self.index.add(person)
+
+
+class AggregatorConsumer(Consumer):
+    # feeds aggregators (see Aggregators) while the tree is generated, a couple's family is
+    # passed on once the next generation (their children) has arrived
+
+    def __init__(self, aggregators):
+        self.aggregators = aggregators
+
+    def run(self, batches):
+        owners = []
+        first = True
+        for batch in batches:
+            children = {}
+            for person in batch:
+                parent = person.get_parent()
+                if not parent is None:
+                    children.setdefault(parent, []).append(person)
+            self.add_families(owners, children)
+            # the descendants own the families, partners have no parent (except the root couple)
+            owners = [
+                person for i, person in enumerate(batch)
+                if not person.get_parent() is None or (first and i == 0)
+            ]
+            first = False
+            for aggregator in self.aggregators:
+                for person in batch:
+                    aggregator.add(person)
+        self.add_families(owners, {})
+
+    # passes each owner's children to the aggregators
+    def add_families(self, owners, children):
+        for person in owners:
+            family = children.get(person, [])
+            for aggregator in self.aggregators:
+                aggregator.add_family(person, family)
+
+
+# generates a tree built with stream=True in this thread and hands every generation batch to
+# each consumer, which runs in its own thread behind a queue of at most max_batches batches
+# a consumer that falls behind blocks generation (backpressure) instead of letting batches
+# pile up, and an error in a consumer stops generation and is raised here
+# sampling and the consumers share the GIL, so the overlap is with I/O (e.g. exporters)
+def run_pipeline(tree, consumers, batched=False, keep_tree=False, max_batches=8):
+    queues = [queue.Queue(maxsize=max_batches) for _ in consumers]
+    errors = []
+
+    def consume(consumer, batch_queue):
+        def batches():
+            while True:
+                batch = batch_queue.get()
+                if batch is DONE:
+                    return
+                yield batch
+
+        try:
+            consumer.run(batches())
+        except BaseException as error:
+            errors.append(error)
+            # keep draining so the producer is never stuck on this queue
+            while not batch_queue.get() is DONE:
+                pass
+
+    threads = [
+        threading.Thread(target=consume, args=(consumer, batch_queue), daemon=True)
+        for consumer, batch_queue in zip(consumers, queues)
+    ]
+    for thread in threads:
+        thread.start()
+
+    # a consumer may still be up to max_batches batches (plus the one it is on) behind, so the
+    # stream keeps the parent links of that many more generations
+    linked_generations = max_batches + 2
+    if batched:
+        generations = tree.stream_generations(keep_tree, linked_generations)
+    else:
+        generations = generation_batches(tree.stream_people(keep_tree, linked_generations))
+    try:
+        for batch in generations:
+            if len(errors) > 0:
+                break
+            for batch_queue in queues:
+                batch_queue.put(batch)
+    finally:
+        for batch_queue in queues:
+            batch_queue.put(DONE)
+        for thread in threads:
+            thread.join()
+    if len(errors) > 0:
+        raise errors[0]
+    tree.finish_instrumentation()
+    return tree
@@ -0,0 +1,124 @@
+import numpy as np
+
+from Aggregators import Aggregator
+from TreeExport import iter_generations
+from TreeStore import genders
+
+
+class Population(Aggregator):
+    # living population over time: people are counted by (year born, year died, direct
+    # descendant, gender), so memory depends on the range of years, not on the number of people
+    # someone is alive in every year from their birth year to their death year (inclusive)
+    name = "population"
+
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, person):
+        key = (
+            person.get_year_born(),
+            person.get_year_died(),
+            bool(person.is_direct_descendant()),
+            person.get_gender(),
+        )
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    # adds count people with the same key
+    def add_count(self, year_born, year_died, direct_descendant, gender, count=1):
+        key = (year_born, year_died, bool(direct_descendant), gender)
+        self.counts[key] = self.counts.get(key, 0) + count
+
+    def merge(self, other):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def empty(self):
+        return Population()
+
+    # returns the first year anyone was born and the last year anyone was alive
+    def year_range(self):
+        if len(self.counts) == 0:
+            return None, None
+        return (
+            min(year_born for year_born, _, _, _ in self.counts),
+            max(year_died for _, year_died, _, _ in self.counts),
+        )
+
+    # returns {"years", "direct", "partner", "total"} lists with how many people were alive in
+    # every year from first_year to last_year, with one difference-array sweep
+    def alive_by_year(self, first_year=None, last_year=None):
+        low, high = self.year_range()
+        first_year = low if first_year is None else first_year
+        last_year = high if last_year is None else last_year
+        if first_year is None or last_year < first_year:
+            return {"years": [], "direct": [], "partner": [], "total": []}
+
+        # +1 in the year someone is born, -1 in the year after they die, clipped to the range
+        years = last_year - first_year + 1
+        changes = {True: [0] * (years + 1), False: [0] * (years + 1)}
+        for (year_born, year_died, direct, _), count in self.counts.items():
+            if year_died < first_year or year_born > last_year:
+                continue
+            changes[direct][max(year_born, first_year) - first_year] += count
+            changes[direct][min(year_died, last_year) + 1 - first_year] -= count
+
+        alive = {}
+        for direct, diff in changes.items():
+            running = 0
+            alive[direct] = []
+            for change in diff[:years]:
+                running += change
+                alive[direct].append(running)
+        return {
+            "years": list(range(first_year, last_year + 1)),
+            "direct": alive[True],
+            "partner": alive[False],
+            "total": [direct + partner for direct, partner in zip(alive[True], alive[False])],
+        }
+
+    # returns how many people were alive in year
+    def alive_in(self, year):
+        return self.alive_by_year(year, year)["total"][0]
+
+    # returns the age pyramid of year: {lowest age of the bin: {gender: count}} for everyone
+    # alive in year, genders missing from the data are counted as "unknown"
+    def age_pyramid(self, year, bin_width=5):
+        pyramid = {}
+        for (year_born, year_died, _, gender), count in self.counts.items():
+            if year_born > year or year_died < year:
+                continue
+            age_bin = (year - year_born) // bin_width * bin_width
+            row = pyramid.setdefault(age_bin, {})
+            gender = "unknown" if gender is None else gender
+            row[gender] = row.get(gender, 0) + count
+        return {age_bin: pyramid[age_bin] for age_bin in sorted(pyramid)}
+
+    def result(self):
+        return self.alive_by_year()
+
+
+# returns the Population of a finished tree in one pass over its people (vectorized for
+# columnar and snapshot trees)
+def tree_population(tree):
+    population = Population()
+    store = tree.store
+    if store is None:
+        for generation in iter_generations(tree.first_people):
+            for person in generation:
+                population.add(person)
+        return population
+
+    columns = np.column_stack(
+        (
+            np.asarray(store.year_born, dtype=np.int64),
+            np.asarray(store.year_died, dtype=np.int64),
+            np.asarray(store.direct_descendant, dtype=np.int64),
+            np.asarray(store.gender, dtype=np.int64),
+        )
+    )
+    keys, counts = np.unique(columns, axis=0, return_counts=True)
+    for (year_born, year_died, direct, gender), count in zip(keys.tolist(), counts.tolist()):
+        population.add_count(
+            year_born, year_died, direct == 1, None if gender < 0 else genders[gender], count
+        )
+    return population
@@ -0,0 +1,74 @@
+import random
+
+import numpy as np
+
+
+class PythonRandom:
+    # random source backed by the standard library's random.Random
+
+    def __init__(self, seed=None):
+        self.generator = random.Random(seed)
+        self.random = self.generator.random
+        self.randint = self.generator.randint
+        self.randrange = self.generator.randrange
+        self.choice = self.generator.choice
+        self.np_generator = None
+
+    # returns a numpy generator for the batch api, seeded from this source
+    def numpy_generator(self):
+        if self.np_generator is None:
+            self.np_generator = np.random.default_rng(self.generator.getrandbits(64))
+        return self.np_generator
+
+
+class BufferedNumpyRandom:
+    # random source backed by numpy's PCG64, handing out uniforms from pre-drawn blocks
+    # blocks start small and double up to block_size so small trees do not pay for a big draw
+
+    def __init__(self, seed=None, block_size=65536, first_block_size=256):
+        self.np_generator = np.random.Generator(np.random.PCG64(seed))
+        self.block_size = block_size
+        self.next_block_size = min(first_block_size, block_size)
+        self.buffer = []
+        self.index = 0
+
+    # returns the numpy generator for the batch api
+    def numpy_generator(self):
+        return self.np_generator
+
+    # returns a float in [0, 1)
+    def random(self):
+        if self.index == len(self.buffer):
+            self.buffer = self.np_generator.random(self.next_block_size).tolist()
+            self.next_block_size = min(self.next_block_size * 2, self.block_size)
+            self.index = 0
+        value = self.buffer[self.index]
+        self.index += 1
+        return value
+
+    # returns an int in [a, b]
+    def randint(self, a, b):
+        return a + int(self.random() * (b - a + 1))
+
+    # returns an int in [start, stop)
+    def randrange(self, start, stop):
+        if stop <= start:
+            raise ValueError(f"empty range for randrange({start}, {stop})")
+        return start + int(self.random() * (stop - start))
+
+    # returns one element of seq
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+
+backends = {
+    "python": PythonRandom,
+    "numpy": BufferedNumpyRandom,
+}
+
+
+# returns a random source of the given backend
+def make_rng(seed=None, backend="python"):
+    if backend not in backends:
+        raise ValueError(f"unknown random backend {backend!r}, expected one of {sorted(backends)}")
+    return backends[backend](seed)
@@ -0,0 +1,203 @@
+import numpy as np
+
+ordinals = {1: "first", 2: "second", 3: "third", 4: "fourth", 5: "fifth"}
+removals = {1: "once", 2: "twice", 3: "three times"}
+
+
+# returns "first", "second", ... for n
+def ordinal(n):
+    return ordinals.get(n, f"{n}th")
+
+
+# returns "great-" repeated n times
+def greats(n):
+    return "great-" * max(n, 0)
+
+
+# returns a gendered word when the gender is known, else the neutral one
+def gendered(gender, male, female, neutral):
+    if gender == "male":
+        return male
+    if gender == "female":
+        return female
+    return neutral
+
+
+class RelationshipIndex:
+    # relationship queries over a finished linked (keep_tree) or columnar tree
+    # descendants of the first person get a depth and binary-lifting ancestor tables, so the
+    # lowest common ancestor of two people takes O(log n) after O(n log n) preprocessing
+    # a partner is placed at their spouse, and counts as a parent of their spouse's children
+
+    def __init__(self, tree):
+        root = tree.first_people[0]
+        # node ids in BFS order, a partner maps to the node id of their spouse
+        self.people = []
+        self.node = {}
+        self.spouse_node = {}
+        parents = []
+        depths = []
+
+        self.node[root] = 0
+        self.people.append(root)
+        parents.append(0)
+        depths.append(0)
+        start = 0
+        while start < len(self.people):
+            person = self.people[start]
+            partner = person.get_partner()
+            if not partner is None and not partner in self.node:
+                self.spouse_node[partner] = start
+            for child in person.get_children() or []:
+                self.node[child] = len(self.people)
+                self.people.append(child)
+                parents.append(start)
+                depths.append(depths[start] + 1)
+            start += 1
+
+        # up[k][v] is the 2 ** k-th ancestor of v (the root is its own ancestor)
+        self.depths = depths
+        self.up = [parents]
+        max_depth = max(depths)
+        while (1 << len(self.up)) <= max_depth:
+            previous = self.up[-1]
+            self.up.append([previous[previous[v]] for v in range(len(previous))])
+        self.depth_array = np.array(depths, dtype=np.int64)
+        self.up_array = np.array(self.up, dtype=np.int64)
+
+    # returns (node id, True if person is a descendant or False for a partner)
+    def locate(self, person):
+        node = self.node.get(person)
+        if not node is None:
+            return node, True
+        node = self.spouse_node.get(person)
+        if node is None:
+            raise KeyError(f"{person!r} is not in this tree")
+        return node, False
+
+    # returns how many generations below the first person someone is (partners share their
+    # spouse's depth)
+    def depth(self, person):
+        return self.depths[self.locate(person)[0]]
+
+    # returns the node id of the ancestor of v that is steps generations up
+    def lift(self, v, steps):
+        k = 0
+        while steps > 0:
+            if steps & 1:
+                v = self.up[k][v]
+            steps >>= 1
+            k += 1
+        return v
+
+    # returns the node id of the lowest common ancestor of two node ids
+    def lca_node(self, u, v):
+        depths = self.depths
+        if depths[u] < depths[v]:
+            u, v = v, u
+        u = self.lift(u, depths[u] - depths[v])
+        if u == v:
+            return u
+        for k in range(len(self.up) - 1, -1, -1):
+            if self.up[k][u] != self.up[k][v]:
+                u = self.up[k][u]
+                v = self.up[k][v]
+        return self.up[0][u]
+
+    # returns the closest descendant both people descend from (partners count from their spouse)
+    def lowest_common_ancestor(self, a, b):
+        return self.people[self.lca_node(self.locate(a)[0], self.locate(b)[0])]
+
+    # returns the node ids of the lowest common ancestors of two arrays of node ids at once
+    def lca_nodes(self, u, v):
+        u = np.asarray(u, dtype=np.int64).copy()
+        v = np.asarray(v, dtype=np.int64).copy()
+        depths = self.depth_array
+        swap = depths[u] < depths[v]
+        u[swap], v[swap] = v[swap], u[swap].copy()
+        steps = depths[u] - depths[v]
+        for k in range(len(self.up_array)):
+            lifted = (steps >> k) & 1 == 1
+            u[lifted] = self.up_array[k][u[lifted]]
+        for k in range(len(self.up_array) - 1, -1, -1):
+            differ = self.up_array[k][u] != self.up_array[k][v]
+            u[differ] = self.up_array[k][u[differ]]
+            v[differ] = self.up_array[k][v[differ]]
+        return np.where(u == v, u, self.up_array[0][u])
+
+    # returns what b is to a, see describe
+    def relationship(self, a, b):
+        u, a_blood = self.locate(a)
+        v, b_blood = self.locate(b)
+        return self.describe(a, b, u, v, a_blood, b_blood, self.lca_node(u, v))
+
+    # returns relationship(a, b) for every (a, b) pair, with all the lowest common ancestors
+    # found in one vectorized pass
+    def relationships(self, pairs):
+        located = [(self.locate(a), self.locate(b)) for a, b in pairs]
+        lcas = self.lca_nodes(
+            [u for (u, _), _ in located], [v for _, (v, _) in located]
+        ).tolist()
+        return [
+            self.describe(a, b, u, v, a_blood, b_blood, lca)
+            for (a, b), ((u, a_blood), (v, b_blood)), lca in zip(pairs, located, lcas)
+        ]
+
+    # returns what b is to a as a dict:
+    #   relationship: self, spouse, ancestor, descendant, sibling, aunt/uncle, niece/nephew or cousin
+    #   up/down: generations from a and from b to their lowest common ancestor
+    #   degree/removed: for cousins, e.g. degree 2 removed 1 is a second cousin once removed
+    #   in_law: if the relationship goes through a partner
+    #   name: the relationship in words, e.g. "first cousin once removed" or "sister-in-law"
+    def describe(self, a, b, u, v, a_blood, b_blood, lca):
+        up = self.depths[u] - self.depths[lca]
+        down = self.depths[v] - self.depths[lca]
+        result = {"up": up, "down": down, "degree": None, "removed": None, "in_law": False}
+        if a is b or a == b:
+            result.update(relationship="self", name="self")
+            return result
+        if u == v and a_blood != b_blood:
+            result.update(relationship="spouse", name=gendered(b.get_gender(), "husband", "wife", "spouse"))
+            return result
+
+        # a partner is a parent of their spouse's descendants, every other link through a
+        # partner is by marriage
+        in_law = False
+        if not a_blood and not (up == 0 and down > 0):
+            in_law = True
+        if not b_blood and not (down == 0 and up > 0):
+            in_law = True
+        result["in_law"] = in_law
+
+        gender = b.get_gender()
+        if up == 0:
+            relationship = "descendant"
+            name = greats(down - 2) + ("grand" if down >= 2 else "") + gendered(
+                gender, "son", "daughter", "child"
+            )
+        elif down == 0:
+            relationship = "ancestor"
+            name = greats(up - 2) + ("grand" if up >= 2 else "") + gendered(
+                gender, "father", "mother", "parent"
+            )
+        elif up == 1 and down == 1:
+            relationship = "sibling"
+            name = gendered(gender, "brother", "sister", "sibling")
+        elif up == 1:
+            relationship = "niece/nephew"
+            name = greats(down - 2) + gendered(gender, "nephew", "niece", "nibling")
+        elif down == 1:
+            relationship = "aunt/uncle"
+            name = greats(up - 2) + gendered(gender, "uncle", "aunt", "pibling")
+        else:
+            relationship = "cousin"
+            degree = min(up, down) - 1
+            removed = abs(up - down)
+            result.update(degree=degree, removed=removed)
+            name = f"{ordinal(degree)} cousin"
+            if removed > 0:
+                name += " " + removals.get(removed, f"{removed} times") + " removed"
+        if in_law:
+            name += "-in-law"
+        result.update(relationship=relationship, name=name)
+        return result
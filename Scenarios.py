@@ -0,0 +1,200 @@
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import SimulationRunner
+from Demographics import extrapolations
+from RandomSource import backends
+
+# what a scenario can change, with the values of an ordinary run
+scenario_defaults = {
+    "birth_scale": 1.0,
+    "marriage_scale": 1.0,
+    "start_year": 1950,
+    "end_year": 2120,
+    "extrapolation": "clamp",
+}
+
+# columns of the results table after the scenario's own
+RESULT_FIELDS = [
+    "trees",
+    "mean_total_people",
+    "std_total_people",
+    "min_total_people",
+    "max_total_people",
+    "mean_distinct_names",
+    "mean_duplicate_name_rate",
+]
+
+
+# returns a scenario for every combination of the given values, e.g.
+# scenario_grid(birth_scale=[0.9, 1.0, 1.1], end_year=[2120, 2200]) gives 6 scenarios
+def scenario_grid(**values):
+    unknown = set(values) - set(scenario_defaults)
+    if len(unknown) > 0:
+        raise ValueError(
+            f"unknown scenario parameters {sorted(unknown)}, expected some of {list(scenario_defaults)}"
+        )
+    names = list(values)
+    return [
+        dict(scenario_defaults, **dict(zip(names, combination)))
+        for combination in itertools.product(*(values[name] for name in names))
+    ]
+
+
+# builds the trees of one scenario for a chunk of seeds and returns their summaries
+# the worker's factory (and its tables) is reused, only the per-year parameters are rebuilt
+def run_scenario_trees(scenario, seeds, batched=False, backend="python"):
+    if SimulationRunner.worker_factory is None:
+        SimulationRunner.init_worker(quiet=True)
+    factory = SimulationRunner.worker_factory
+    factory.set_rate_scales(scenario["birth_scale"], scenario["marriage_scale"])
+    try:
+        summaries, _ = SimulationRunner.run_trees(
+            seeds, batched, backend, scenario["end_year"], None, scenario["start_year"],
+            scenario["extrapolation"],
+        )
+    finally:
+        factory.set_rate_scales()
+    return summaries
+
+
+# returns the results table row of a scenario from its tree summaries
+def scenario_row(scenario, summaries):
+    totals = [summary["total_people"] for summary in summaries]
+    merged = SimulationRunner.merge_summaries(summaries)
+    return dict(
+        scenario,
+        trees=len(summaries),
+        mean_total_people=merged["mean_total_people"],
+        std_total_people=float(np.std(totals)),
+        min_total_people=min(totals),
+        max_total_people=max(totals),
+        mean_distinct_names=float(np.mean([summary["distinct_names"] for summary in summaries])),
+        mean_duplicate_name_rate=merged["mean_duplicate_name_rate"],
+    )
+
+
+# runs trees_per_scenario trees of every scenario across a process pool and returns one results
+# row per scenario, in order
+# every scenario uses the same seeds, so differences between rows come from the parameters
+# the data files are loaded once: workers are forked from this process and share its factory
+# copy-on-write (where fork is not available each worker loads them once instead)
+def run_scenarios(
+        scenarios, trees_per_scenario=10, master_seed=0, workers=None, batched=False,
+        backend="python"):
+    scenarios = [dict(scenario_defaults, **scenario) for scenario in scenarios]
+    seeds = SimulationRunner.derive_seeds(master_seed, trees_per_scenario)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # (scenario index, seeds) tasks, small enough to keep every worker busy
+    chunksize = max(1, len(scenarios) * trees_per_scenario // (workers * 4))
+    tasks = [
+        (i, seeds[start:start + chunksize])
+        for i in range(len(scenarios))
+        for start in range(0, len(seeds), chunksize)
+    ]
+
+    if workers <= 1:
+        results = [
+            run_scenario_trees(scenarios[i], chunk, batched, backend) for i, chunk in tasks
+        ]
+    else:
+        if "fork" in multiprocessing.get_all_start_methods():
+            if SimulationRunner.worker_factory is None:
+                SimulationRunner.init_worker(quiet=True)
+            pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("fork")
+            )
+        else:
+            pool = ProcessPoolExecutor(
+                max_workers=workers, initializer=SimulationRunner.init_worker, initargs=(True,)
+            )
+        with pool as executor:
+            results = list(
+                executor.map(
+                    run_scenario_trees,
+                    [scenarios[i] for i, _ in tasks],
+                    [chunk for _, chunk in tasks],
+                    [batched] * len(tasks),
+                    [backend] * len(tasks),
+                )
+            )
+
+    summaries = [[] for _ in scenarios]
+    for (i, _), chunk_summaries in zip(tasks, results):
+        summaries[i].extend(chunk_summaries)
+    return [scenario_row(scenario, summaries[i]) for i, scenario in enumerate(scenarios)]
+
+
+# writes the results table as csv
+def write_csv(rows, file):
+    writer = csv.DictWriter(file, fieldnames=list(scenario_defaults) + RESULT_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run family trees for every combination of the given parameters"
+    )
+    parser.add_argument("--birth-scale", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--marriage-scale", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--start-year", type=int, nargs="+", default=[1950])
+    parser.add_argument("--end-year", type=int, nargs="+", default=[2120])
+    parser.add_argument(
+        "--extrapolation", choices=extrapolations, nargs="+", default=["clamp"],
+        help="how years past the data files are handled",
+    )
+    parser.add_argument("--trees", type=int, default=10, help="trees per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="worker processes (default one per cpu)"
+    )
+    parser.add_argument("--batched", action="store_true")
+    parser.add_argument("--backend", choices=sorted(backends), default="python")
+    parser.add_argument("--format", choices=["csv", "json"], default="csv")
+    parser.add_argument("--out", default=None, help="write the table here instead of stdout")
+    args = parser.parse_args(argv)
+    if args.trees < 1:
+        parser.error("--trees must be at least 1")
+
+    scenarios = [
+        scenario for scenario in scenario_grid(
+            birth_scale=args.birth_scale,
+            marriage_scale=args.marriage_scale,
+            start_year=args.start_year,
+            end_year=args.end_year,
+            extrapolation=args.extrapolation,
+        )
+        if scenario["start_year"] <= scenario["end_year"]
+    ]
+    try:
+        rows = run_scenarios(
+            scenarios, args.trees, args.seed, args.workers, args.batched, args.backend
+        )
+    except ValueError as error:
+        # e.g. --extrapolation error with years the data files do not cover
+        parser.error(str(error))
+
+    file = sys.stdout if args.out is None else open(args.out, "w", newline="")
+    try:
+        if args.format == "csv":
+            write_csv(rows, file)
+        else:
+            file.write(json.dumps(rows, indent=2) + "\n")
+    finally:
+        if not args.out is None:
+            file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Aggregators import aggregate_results, default_aggregators, merge_aggregators
+from Demographics import extrapolations
+from FamilyTree import FamilyTree
+from PersonFactory import PersonFactory
+from RandomSource import backends, make_rng
+
+# the factory each worker process builds once and reuses for all its trees
+worker_factory = None
+
+
+# loads the data files once per worker process, with its progress messages sent to stderr
+# if quiet (for commands whose stdout is their output)
+def init_worker(quiet=False):
+    global worker_factory
+    if quiet:
+        with contextlib.redirect_stdout(sys.stderr):
+            worker_factory = PersonFactory()
+    else:
+        worker_factory = PersonFactory()
+
+
+# returns one seed per tree derived from the master seed
+def derive_seeds(master_seed, num_trees):
+    children = np.random.SeedSequence(master_seed).spawn(num_trees)
+    return [int(child.generate_state(1, dtype=np.uint64)[0]) for child in children]
+
+
+# builds one tree from a seed and returns its compact summary
+# aggregators are copied empty for the tree and returned in the summary
+# extrapolation is how years the data files do not cover are handled (see Demographics)
+def run_tree(
+        seed, batched=False, backend="python", end_year=2120, aggregators=None, start_year=1950,
+        extrapolation="clamp"):
+    if worker_factory is None:
+        init_worker(quiet=True)
+    worker_factory.set_extrapolation(extrapolation)
+    tree = FamilyTree(
+        batched=batched,
+        factory=worker_factory,
+        rng=make_rng(seed, backend),
+        end_year=end_year,
+        aggregators=None if aggregators is None else [a.empty() for a in aggregators],
+        start_year=start_year,
+    )
+    return summarize_tree(tree)
+
+
+# builds the trees of a chunk of seeds, returns their summaries and their aggregators merged,
+# so only one set of aggregators per chunk goes back to the parent process
+def run_trees(
+        seeds, batched=False, backend="python", end_year=2120, aggregators=None, start_year=1950,
+        extrapolation="clamp"):
+    summaries = [
+        run_tree(seed, batched, backend, end_year, aggregators, start_year, extrapolation)
+        for seed in seeds
+    ]
+    merged = merge_aggregators(summary.pop("aggregators") for summary in summaries)
+    return summaries, merged
+
+
+# returns the aggregate statistics of a tree (nothing that references people)
+def summarize_tree(tree):
+    return {
+        "total_people": tree.get_total_number_of_people(),
+        "people_by_decade": dict(tree.total_people_by_decade),
+        "duplicate_names": len(tree.get_duplicate_names()),
+        "distinct_names": len(tree.names_count),
+        "aggregators": tree.aggregators,
+    }
+
+
+# merges tree summaries into distributions over all trees
+def merge_summaries(summaries):
+    totals = [summary["total_people"] for summary in summaries]
+    people_by_decade = {}
+    for summary in summaries:
+        for decade, count in summary["people_by_decade"].items():
+            people_by_decade[decade] = people_by_decade.get(decade, 0) + count
+    duplicate_rates = [
+        summary["duplicate_names"] / summary["distinct_names"] for summary in summaries
+    ]
+    return {
+        "num_trees": len(summaries),
+        "total_people": totals,
+        "mean_total_people": float(np.mean(totals)) if totals else 0.0,
+        "people_by_decade": dict(sorted(people_by_decade.items())),
+        "duplicate_name_rate": duplicate_rates,
+        "mean_duplicate_name_rate": float(np.mean(duplicate_rates)) if duplicate_rates else 0.0,
+    }
+
+
+# runs num_trees independent trees across a process pool and returns the merged results
+# (including the merged aggregators, which are fed by every tree)
+def run_simulations(
+        num_trees, master_seed=0, workers=None, batched=False, backend="python", end_year=2120,
+        aggregators=None, start_year=1950, extrapolation="clamp"):
+    seeds = derive_seeds(master_seed, num_trees)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        chunks = [
+            run_trees(seeds, batched, backend, end_year, aggregators, start_year, extrapolation)
+        ]
+    else:
+        chunksize = max(1, num_trees // (workers * 4))
+        seed_chunks = [seeds[i:i + chunksize] for i in range(0, num_trees, chunksize)]
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker, initargs=(True,)
+        ) as executor:
+            chunks = list(
+                executor.map(
+                    run_trees,
+                    seed_chunks,
+                    [batched] * len(seed_chunks),
+                    [backend] * len(seed_chunks),
+                    [end_year] * len(seed_chunks),
+                    [aggregators] * len(seed_chunks),
+                    [start_year] * len(seed_chunks),
+                    [extrapolation] * len(seed_chunks),
+                )
+            )
+    summaries = [summary for chunk_summaries, _ in chunks for summary in chunk_summaries]
+    results = merge_summaries(summaries)
+    if not aggregators is None:
+        results["aggregates"] = aggregate_results(
+            merge_aggregators(chunk_aggregators for _, chunk_aggregators in chunks)
+        )
+    results["master_seed"] = master_seed
+    results["backend"] = backend
+    results["start_year"] = start_year
+    results["end_year"] = end_year
+    results["extrapolation"] = extrapolation
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many independent family tree simulations")
+    parser.add_argument("num_trees", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batched", action="store_true")
+    parser.add_argument("--backend", choices=sorted(backends), default="python")
+    parser.add_argument("--start-year", type=int, default=1950)
+    parser.add_argument("--end-year", type=int, default=2120)
+    parser.add_argument(
+        "--extrapolation", choices=extrapolations, default="clamp",
+        help="how years past the data files are handled",
+    )
+    parser.add_argument(
+        "--aggregates", action="store_true", help="also collect the default aggregators"
+    )
+    args = parser.parse_args()
+    try:
+        results = run_simulations(
+            args.num_trees, args.seed, args.workers, args.batched, args.backend, args.end_year,
+            default_aggregators() if args.aggregates else None, args.start_year,
+            args.extrapolation,
+        )
+    except ValueError as error:
+        # e.g. --extrapolation error with years the data files do not cover
+        parser.error(str(error))
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
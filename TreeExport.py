@@ -0,0 +1,252 @@
+import csv
+import json
+
+from TreeStore import genders
+
+# exported columns, partner_id/parent_id are -1 (written as empty/null) when missing,
+# so is gender when it is None
+FIELDS = [
+    "id",
+    "first_name",
+    "last_name",
+    "gender",
+    "year_born",
+    "year_died",
+    "direct_descendant",
+    "partner_id",
+    "parent_id",
+]
+
+
+class CSVWriter:
+    # writes people batches to a csv file with a header row
+
+    def __init__(self, path):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(FIELDS)
+
+    def write_batch(self, columns):
+        self.writer.writerows(
+            zip(
+                columns["id"],
+                columns["first_name"],
+                columns["last_name"],
+                ["" if gender is None else gender for gender in columns["gender"]],
+                columns["year_born"],
+                columns["year_died"],
+                [int(flag) for flag in columns["direct_descendant"]],
+                ["" if link < 0 else link for link in columns["partner_id"]],
+                ["" if link < 0 else link for link in columns["parent_id"]],
+            )
+        )
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class JSONLinesWriter:
+    # writes people batches as one json object per line
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+        # names repeat a lot, so each one is only escaped once
+        self.quoted_names = {}
+
+    def quote(self, name):
+        quoted = self.quoted_names.get(name)
+        if quoted is None:
+            quoted = json.dumps(name)
+            self.quoted_names[name] = quoted
+        return quoted
+
+    def write_batch(self, columns):
+        quote = self.quote
+        self.file.write(
+            "".join(
+                f'{{"id": {person_id}, "first_name": {quote(first_name)}, '
+                f'"last_name": {quote(last_name)}, '
+                f'"gender": {"null" if gender is None else quote(gender)}, "year_born": {year_born}, '
+                f'"year_died": {year_died}, "direct_descendant": {"true" if direct else "false"}, '
+                f'"partner_id": {"null" if partner_id < 0 else partner_id}, '
+                f'"parent_id": {"null" if parent_id < 0 else parent_id}}}\n'
+                for person_id, first_name, last_name, gender, year_born, year_died, direct, partner_id, parent_id in zip(
+                    *(columns[field] for field in FIELDS)
+                )
+            )
+        )
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ArrowTableWriter:
+    # base for the pyarrow based writers, every batch becomes one record batch/row group
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("parquet/arrow export needs pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.schema = pa.schema(
+            [
+                ("id", pa.int64()),
+                ("first_name", pa.string()),
+                ("last_name", pa.string()),
+                ("gender", pa.string()),
+                ("year_born", pa.int32()),
+                ("year_died", pa.int32()),
+                ("direct_descendant", pa.bool_()),
+                ("partner_id", pa.int64()),
+                ("parent_id", pa.int64()),
+            ]
+        )
+        self.writer = self.open_writer(path)
+
+    def open_writer(self, path):
+        raise NotImplementedError
+
+    def write_batch(self, columns):
+        pa = self.pa
+        arrays = []
+        for field in self.schema:
+            values = columns[field.name]
+            if field.name in ("partner_id", "parent_id"):
+                arrays.append(pa.array(values, type=field.type, mask=[link < 0 for link in values]))
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParquetWriter(ArrowTableWriter):
+    # writes people batches to a parquet file
+
+    def open_writer(self, path):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(path, self.schema)
+
+
+class ArrowWriter(ArrowTableWriter):
+    # writes people batches to an arrow ipc file
+
+    def open_writer(self, path):
+        return self.pa.ipc.new_file(path, self.schema)
+
+
+writers = {
+    "csv": CSVWriter,
+    "jsonl": JSONLinesWriter,
+    "parquet": ParquetWriter,
+    "arrow": ArrowWriter,
+}
+
+
+# returns a writer for the given format
+def open_writer(path, format):
+    if format not in writers:
+        raise ValueError(f"unknown export format {format!r}, expected one of {sorted(writers)}")
+    return writers[format](path)
+
+
+# returns empty export columns
+def new_batch():
+    return {field: [] for field in FIELDS}
+
+
+# writes people batches of a finished tree and returns how many rows were written
+def export_tree(tree, writer, chunk_size=65536):
+    if tree.store is None:
+        return export_generations(iter_generations(tree.first_people), writer, chunk_size)
+
+    # columnar trees already have ids, so rows are read straight from the columns
+    store = tree.store
+    names = [store.names[name_id] for name_id in range(len(store.names))]
+    for start in range(0, len(store), chunk_size):
+        end = min(start + chunk_size, len(store))
+        writer.write_batch(
+            {
+                "id": list(range(start, end)),
+                "first_name": [names[i] for i in store.first_name_id[start:end]],
+                "last_name": [names[i] for i in store.last_name_id[start:end]],
+                "gender": [None if code < 0 else genders[code] for code in store.gender[start:end]],
+                "year_born": [int(year) for year in store.year_born[start:end]],
+                "year_died": [int(year) for year in store.year_died[start:end]],
+                "direct_descendant": [flag == 1 for flag in store.direct_descendant[start:end]],
+                "partner_id": [int(link) for link in store.partner_id[start:end]],
+                "parent_id": [int(link) for link in store.parent_id[start:end]],
+            }
+        )
+    return len(store)
+
+
+# yields the people of a finished linked tree in the same batches as stream_generations
+def iter_generations(first_people):
+    generation = first_people[:1]
+    while not len(generation) == 0:
+        finished = list(generation)
+        next_generation = []
+        for person in generation:
+            partner = person.get_partner()
+            if not partner is None:
+                finished.append(partner)
+            next_generation.extend(person.get_children() or [])
+        yield finished
+        generation = next_generation
+
+
+# writes people from generation batches (e.g. FamilyTree.stream_generations while the tree is
+# still being generated) and returns how many rows were written
+# a person's partner is in the same batch and their parent in the previous one, so only the
+# ids of two batches are kept
+def export_generations(generations, writer, chunk_size=65536):
+    next_id = 0
+    previous_ids = {}
+    batch = new_batch()
+    for generation in generations:
+        ids = {}
+        for person in generation:
+            ids[person] = next_id
+            next_id += 1
+
+        for person in generation:
+            partner = person.get_partner()
+            parent = person.get_parent()
+            batch["id"].append(ids[person])
+            batch["first_name"].append(person.get_first_name())
+            batch["last_name"].append(person.get_last_name())
+            batch["gender"].append(person.get_gender())
+            batch["year_born"].append(person.get_year_born())
+            batch["year_died"].append(person.get_year_died())
+            batch["direct_descendant"].append(person.is_direct_descendant())
+            batch["partner_id"].append(-1 if partner is None else ids.get(partner, -1))
+            batch["parent_id"].append(-1 if parent is None else previous_ids.get(parent, -1))
+            if len(batch["id"]) >= chunk_size:
+                writer.write_batch(batch)
+                batch = new_batch()
+        previous_ids = ids
+
+    if len(batch["id"]) > 0:
+        writer.write_batch(batch)
+    return next_id
@@ -0,0 +1,120 @@
+from bisect import bisect_left, bisect_right
+
+
+class TreeIndex:
+    # query indexes over a tree, filled by FamilyTree.add_person while generating
+
+    def __init__(self):
+        self.people = []
+        self.by_full_name = {}
+        self.by_last_name = {}
+        # (year, person) lists, sorted lazily on the first range query after new people
+        self.born = []
+        self.died = []
+        self.years_sorted = True
+        # lineage labels, rebuilt lazily on the first lineage query after new people
+        self.root = None
+        self.position = {}
+        self.ranges = {}
+        self.lineage_built = True
+
+    # adds a person to every index
+    def add(self, person):
+        if person is None:
+            return
+        if self.root is None:
+            self.root = person
+        self.people.append(person)
+        first_name = person.get_first_name()
+        last_name = person.get_last_name()
+        self.by_full_name.setdefault((first_name, last_name), []).append(person)
+        self.by_last_name.setdefault(last_name, []).append(person)
+        self.born.append(person.get_year_born())
+        self.died.append(person.get_year_died())
+        self.years_sorted = False
+        self.lineage_built = False
+
+    # returns everyone with this first and last name
+    def find_by_name(self, first_name, last_name):
+        return list(self.by_full_name.get((first_name, last_name), []))
+
+    # returns everyone with this last name
+    def find_by_last_name(self, last_name):
+        return list(self.by_last_name.get(last_name, []))
+
+    # sorts the year indexes if people were added since the last range query
+    def sort_years(self):
+        if self.years_sorted:
+            return
+        self.born_order = sorted(range(len(self.people)), key=self.born.__getitem__)
+        self.born_sorted = [self.born[i] for i in self.born_order]
+        self.died_sorted = sorted(self.died)
+        self.years_sorted = True
+
+    # returns everyone born in [first_year, last_year]
+    def born_between(self, first_year, last_year):
+        self.sort_years()
+        start = bisect_left(self.born_sorted, first_year)
+        end = bisect_right(self.born_sorted, last_year)
+        return [self.people[i] for i in self.born_order[start:end]]
+
+    # returns how many people were alive in year (born in or before it, died in or after it)
+    def count_alive_in(self, year):
+        self.sort_years()
+        return bisect_right(self.born_sorted, year) - bisect_left(self.died_sorted, year)
+
+    # returns everyone alive in year
+    def alive_in(self, year):
+        self.sort_years()
+        end = bisect_right(self.born_sorted, year)
+        return [
+            self.people[i] for i in self.born_order[:end] if self.died[i] >= year
+        ]
+
+    # labels the bloodline with an euler tour from the root: a descendant's position falls
+    # inside the (start, end] range of each of their ancestors, a partner shares their
+    # spouse's range but has no position of their own
+    def build_lineage(self):
+        if self.lineage_built:
+            return
+        self.position = {}
+        self.ranges = {}
+        if self.root is None:
+            self.lineage_built = True
+            return
+
+        counter = 0
+        self.position[self.root] = counter
+        stack = [(self.root, iter(self.root.get_children() or []))]
+        while not len(stack) == 0:
+            person, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                self.ranges[person] = (self.position[person], counter)
+                partner = person.get_partner()
+                if not partner is None and not partner in self.position:
+                    self.ranges[partner] = (self.position[person], counter)
+                continue
+            counter += 1
+            self.position[child] = counter
+            stack.append((child, iter(child.get_children() or [])))
+        self.lineage_built = True
+
+    # returns if ancestor is a parent, grandparent, ... of person (partners count for their
+    # spouse's descendants)
+    def is_ancestor(self, ancestor, person):
+        self.build_lineage()
+        position = self.position.get(person, -1)
+        if ancestor not in self.ranges or position < 0:
+            return False
+        start, end = self.ranges[ancestor]
+        return start < position <= end
+
+    # returns how many descendants (children, grandchildren, ...) a person has
+    def count_descendants(self, person):
+        self.build_lineage()
+        if person not in self.ranges:
+            return 0
+        start, end = self.ranges[person]
+        return end - start
@@ -0,0 +1,166 @@
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from TreeStore import PersonView, TreeStore
+
+# file layout: header, section table, then every section aligned to 8 bytes
+# header: magic, version, number of sections
+# section table: (offset, size in bytes) for each section in sections order
+MAGIC = b"FAMTREE\0"
+VERSION = 3
+HEADER = struct.Struct("<8sII")
+SECTION_ENTRY = struct.Struct("<QQ")
+ALIGNMENT = 8
+
+# fixed-width little endian columns, one row per person
+column_dtypes = {
+    "year_born": "<i4",
+    "year_died": "<i4",
+    "first_name_id": "<i4",
+    "last_name_id": "<i4",
+    "direct_descendant": "<i1",
+    "gender": "<i1",
+    "partner_id": "<i4",
+    "parent_id": "<i4",
+    "child_start": "<i4",
+    "child_count": "<i4",
+}
+# name_offsets/name_data: string table, name i is name_data[name_offsets[i]:name_offsets[i + 1]]
+# name_counts: (first name id, last name id, count) rows backing names_count
+# direct_name_counts: the same rows counting only the direct descendants
+# stats: json with total_people and total_people_by_decade
+sections = list(column_dtypes) + [
+    "name_offsets", "name_data", "name_counts", "direct_name_counts", "stats"
+]
+
+
+# writes a FamilyTree to path
+def save_snapshot(tree, path):
+    store = tree.store
+    if store is None:
+        store = TreeStore.from_people(tree.first_people)
+
+    encoded_names = [name.encode("utf-8") for name in store.names]
+    name_offsets = np.zeros(len(encoded_names) + 1, dtype="<u8")
+    name_offsets[1:] = np.cumsum([len(name) for name in encoded_names])
+
+    first_name_ids = np.asarray(store.first_name_id, dtype="<i4")
+    last_name_ids = np.asarray(store.last_name_id, dtype="<i4")
+    direct = np.asarray(store.direct_descendant, dtype=bool)
+    name_counts = count_full_names(first_name_ids, last_name_ids)
+    direct_name_counts = count_full_names(first_name_ids[direct], last_name_ids[direct])
+    stats = {
+        "total_people": tree.total_people,
+        "total_people_by_decade": tree.total_people_by_decade,
+    }
+
+    payloads = {
+        name: np.asarray(getattr(store, name), dtype=dtype).tobytes()
+        for name, dtype in column_dtypes.items()
+    }
+    payloads["name_offsets"] = name_offsets.tobytes()
+    payloads["name_data"] = b"".join(encoded_names)
+    payloads["name_counts"] = name_counts.tobytes()
+    payloads["direct_name_counts"] = direct_name_counts.tobytes()
+    payloads["stats"] = json.dumps(stats).encode("utf-8")
+
+    offset = align(HEADER.size + SECTION_ENTRY.size * len(sections))
+    table = []
+    for name in sections:
+        table.append((offset, len(payloads[name])))
+        offset = align(offset + len(payloads[name]))
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(sections)))
+        for entry in table:
+            file.write(SECTION_ENTRY.pack(*entry))
+        for name, (offset, size) in zip(sections, table):
+            file.write(b"\0" * (offset - file.tell()))
+            file.write(payloads[name])
+
+
+# returns the (first name id, last name id, count) rows of the distinct full names
+def count_full_names(first_name_ids, last_name_ids):
+    full_name_ids, counts = np.unique(
+        np.column_stack((first_name_ids, last_name_ids)), axis=0, return_counts=True
+    )
+    return np.column_stack((full_name_ids, counts)).astype("<i4")
+
+
+# returns offset rounded up to the section alignment
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class NameTable:
+    # list-like access to the snapshot string table, decoding names only when read
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, name_id):
+        return bytes(self.data[self.offsets[name_id]:self.offsets[name_id + 1]]).decode("utf-8")
+
+
+class SnapshotStore:
+    # read-only TreeStore stand-in whose columns are numpy views over a mmapped snapshot
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, num_sections = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a family tree snapshot")
+        if version != VERSION or num_sections != len(sections):
+            raise ValueError(f"{path} has unsupported snapshot version {version}")
+
+        self.sections = {}
+        for i, name in enumerate(sections):
+            self.sections[name] = SECTION_ENTRY.unpack_from(
+                self.buffer, HEADER.size + i * SECTION_ENTRY.size
+            )
+        for name, dtype in column_dtypes.items():
+            setattr(self, name, self.section_array(name, dtype))
+        self.names = NameTable(
+            self.section_array("name_offsets", "<u8"),
+            memoryview(self.buffer)[self.section_slice("name_data")],
+        )
+
+    # returns the byte range of a section
+    def section_slice(self, name):
+        offset, size = self.sections[name]
+        return slice(offset, offset + size)
+
+    # returns a section as a numpy array over the mapped file (no copy)
+    def section_array(self, name, dtype):
+        offset, size = self.sections[name]
+        return np.frombuffer(
+            self.buffer, dtype=dtype, count=size // np.dtype(dtype).itemsize, offset=offset
+        )
+
+    # returns the json stats section
+    def stats(self):
+        return json.loads(bytes(self.buffer[self.section_slice("stats")]).decode("utf-8"))
+
+    # returns the (first name id, last name id, count) rows, of everyone or of the direct
+    # descendants only
+    def name_counts(self, direct_only=False):
+        section = "direct_name_counts" if direct_only else "name_counts"
+        return self.section_array(section, "<i4").reshape(-1, 3)
+
+    # returns the number of people in the store
+    def __len__(self):
+        return len(self.year_born)
+
+    # returns a Person-like view of a row, or None for a missing id
+    def view(self, person_id):
+        if person_id < 0:
+            return None
+        return PersonView(self, int(person_id))
@@ -0,0 +1,246 @@
+from array import array
+from collections import deque
+
+# gender column codes are indexes into genders, -1 when unknown
+genders = ["male", "female"]
+gender_codes = {gender: code for code, gender in enumerate(genders)}
+
+
+# returns the column code of gender, rejecting genders the column cannot store (the gender
+# tables would need a new entry in genders, and snapshots a new version, to add one)
+def gender_code(gender):
+    if gender is None:
+        return -1
+    code = gender_codes.get(gender)
+    if code is None:
+        raise ValueError(f"unknown gender {gender!r}, expected one of {genders} or None")
+    return code
+
+
+class TreeStore:
+    # column typecodes, a person's id is their row index in every column
+    columns = {
+        "year_born": "i",
+        "year_died": "i",
+        "first_name_id": "i",
+        "last_name_id": "i",
+        "direct_descendant": "b",
+        "gender": "b",
+        "partner_id": "i",
+        "parent_id": "i",
+        # children of a person are the id range [child_start, child_start + child_count)
+        "child_start": "i",
+        "child_count": "i",
+    }
+
+    def __init__(self):
+        for name, typecode in self.columns.items():
+            setattr(self, name, array(typecode))
+        self.names = []
+        self.name_ids = {}
+
+    # returns a store holding a linked Person tree, in the same BFS order generation uses
+    @classmethod
+    def from_people(cls, first_people):
+        store = cls()
+        people = []
+        rows = {}
+
+        def add(person):
+            rows[id(person)] = len(people)
+            people.append(person)
+            store.add(
+                person.get_year_born(),
+                person.get_year_died(),
+                person.get_first_name(),
+                person.get_last_name(),
+                person.is_direct_descendant(),
+                person.get_gender(),
+            )
+
+        for person in first_people:
+            add(person)
+        queue = deque(first_people[:1])
+        while not len(queue) == 0:
+            person = queue.popleft()
+            partner = person.get_partner()
+            if not partner is None and not id(partner) in rows:
+                add(partner)
+            for child in person.get_children() or []:
+                if not id(child) in rows:
+                    add(child)
+                    queue.append(child)
+
+        # link rows once every person has an id
+        for row, person in enumerate(people):
+            partner = person.get_partner()
+            parent = person.get_parent()
+            if not partner is None:
+                store.partner_id[row] = rows[id(partner)]
+            if not parent is None:
+                store.parent_id[row] = rows[id(parent)]
+            children = person.get_children()
+            if not children is None:
+                store.set_children(row, [store.view(rows[id(child)]) for child in children])
+        return store
+
+    # returns the number of people in the store
+    def __len__(self):
+        return len(self.year_born)
+
+    # returns the id of a name, adding it to the name table if needed
+    def intern_name(self, name):
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.names.append(name)
+            self.name_ids[name] = name_id
+        return name_id
+
+    # adds a new row and returns its id
+    def add(self, year_born, year_died, first_name, last_name, direct_descendant, gender=None):
+        # checked first, so a rejected gender leaves no half-written row
+        code = gender_code(gender)
+        person_id = len(self.year_born)
+        self.year_born.append(year_born)
+        self.year_died.append(year_died)
+        self.first_name_id.append(self.intern_name(first_name))
+        self.last_name_id.append(self.intern_name(last_name))
+        self.direct_descendant.append(1 if direct_descendant else 0)
+        self.gender.append(code)
+        self.partner_id.append(-1)
+        self.parent_id.append(-1)
+        self.child_start.append(-1)
+        self.child_count.append(0)
+        return person_id
+
+    # copies a Person object into a new row and returns a view of it
+    def add_person(self, person):
+        if person is None:
+            return None
+        return self.view(
+            self.add(
+                person.get_year_born(),
+                person.get_year_died(),
+                person.get_first_name(),
+                person.get_last_name(),
+                person.is_direct_descendant(),
+                person.get_gender(),
+            )
+        )
+
+    # returns a Person-like view of a row, or None for a missing id
+    def view(self, person_id):
+        if person_id < 0:
+            return None
+        return PersonView(self, person_id)
+
+    # sets a person's children to a list of views that must be consecutive rows
+    def set_children(self, person_id, children):
+        if len(children) == 0:
+            self.child_start[person_id] = len(self.year_born)
+            self.child_count[person_id] = 0
+            return
+        start = children[0].id
+        for i, child in enumerate(children):
+            if child.store is not self or child.id != start + i:
+                raise ValueError("children must be consecutive rows of the same store")
+        self.child_start[person_id] = start
+        self.child_count[person_id] = len(children)
+
+
+class PersonView:
+    # thin proxy exposing the Person api over a TreeStore row
+    __slots__ = ("store", "id")
+
+    def __init__(self, store, person_id):
+        self.store = store
+        self.id = person_id
+
+    def __eq__(self, other):
+        return isinstance(other, PersonView) and self.store is other.store and self.id == other.id
+
+    def __hash__(self):
+        return hash((id(self.store), self.id))
+
+    def __repr__(self):
+        return f"PersonView({self.id}, {self.get_first_name()} {self.get_last_name()})"
+
+    # return the year this person was born
+    def get_year_born(self):
+        return self.store.year_born[self.id]
+
+    # set the year this person was born
+    def set_year_born(self, new_year):
+        self.store.year_born[self.id] = new_year
+
+    # return the year this person died
+    def get_year_died(self):
+        return self.store.year_died[self.id]
+
+    # set the year this person died
+    def set_year_died(self, new_year):
+        self.store.year_died[self.id] = new_year
+
+    # return this person's first name
+    def get_first_name(self):
+        return self.store.names[self.store.first_name_id[self.id]]
+
+    # set this person's first name
+    def set_first_name(self, name):
+        self.store.first_name_id[self.id] = self.store.intern_name(name)
+
+    # return this person's last name
+    def get_last_name(self):
+        return self.store.names[self.store.last_name_id[self.id]]
+
+    # set this person's last name
+    def set_last_name(self, name):
+        self.store.last_name_id[self.id] = self.store.intern_name(name)
+
+    # return this person's partner (view)
+    def get_partner(self):
+        return self.store.view(self.store.partner_id[self.id])
+
+    # set this person's partner
+    def set_partner(self, partner):
+        self.store.partner_id[self.id] = -1 if partner is None else partner.id
+
+    # return a list containing this person's children (None if never set)
+    def get_children(self):
+        start = self.store.child_start[self.id]
+        if start < 0:
+            return None
+        return [
+            PersonView(self.store, child_id)
+            for child_id in range(start, start + self.store.child_count[self.id])
+        ]
+
+    # set this person's children
+    def set_children(self, children):
+        self.store.set_children(self.id, children)
+
+    # return this person's parent
+    def get_parent(self):
+        return self.store.view(self.store.parent_id[self.id])
+
+    # set this person's parent
+    def set_parent(self, parent):
+        self.store.parent_id[self.id] = -1 if parent is None else parent.id
+
+    # set this person's direct descendant status
+    def set_is_direct_descendant(self, bool):
+        self.store.direct_descendant[self.id] = 1 if bool else 0
+
+    # return if this person is a direct descendant
+    def is_direct_descendant(self):
+        return self.store.direct_descendant[self.id] == 1
+
+    # return this person's gender ("male", "female" or None if unknown)
+    def get_gender(self):
+        code = self.store.gender[self.id]
+        return None if code < 0 else genders[code]
+
+    # set this person's gender
+    def set_gender(self, gender):
+        self.store.gender[self.id] = gender_code(gender)